@@ -1,6 +1,14 @@
-from django.contrib import admin
+import os
+import subprocess
+import sys
+import threading
+
+from django.conf import settings
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, VitalRecord, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest
+from django.utils import timezone
+from .bulk_export import is_export_running
+from .models import User, VitalRecord, VitalDayBlock, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest, TwinState, RevokedToken
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -9,6 +17,30 @@ class UserAdmin(BaseUserAdmin):
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Additional Info', {'fields': ('avatar_url', 'theme_preference')}),
     )
+    actions = ['export_dataset']
+
+    @admin.action(description='Export selected users to Parquet (background)')
+    def export_dataset(self, request, queryset):
+        if is_export_running():
+            self.message_user(request, 'A dataset export is already running; try again when it has finished.',
+                              messages.WARNING)
+            return
+        output_dir = os.path.join(settings.DATASET_EXPORT_ROOT, timezone.now().strftime('%Y%m%dT%H%M%S'))
+        os.makedirs(output_dir, exist_ok=True)
+        cohort_file = os.path.join(output_dir, 'cohort.txt')
+        with open(cohort_file, 'w', encoding='utf-8') as cohort:
+            cohort.writelines(f'{user_id}\n' for user_id in queryset.values_list('id', flat=True))
+        # The export uses a process pool, so it runs as its own process rather than in the web worker.
+        # The command itself refuses to run next to another export, so double clicks cannot stack pools.
+        with open(os.path.join(output_dir, 'export.log'), 'w', encoding='utf-8') as log:
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'export_dataset',
+                 '--cohort-file', cohort_file, '--output', output_dir],
+                stdout=log, stderr=subprocess.STDOUT, cwd=settings.BASE_DIR,
+            )
+        # Reap the child when it exits so finished exports do not linger as zombies.
+        threading.Thread(target=process.wait, name='export-dataset-reaper', daemon=True).start()
+        self.message_user(request, f'Export of {queryset.count()} user(s) started in {output_dir}', messages.SUCCESS)
 
 @admin.register(VitalRecord)
 class VitalRecordAdmin(admin.ModelAdmin):
@@ -16,6 +48,13 @@ class VitalRecordAdmin(admin.ModelAdmin):
     list_filter = ['timestamp', 'user']
     ordering = ['-timestamp']
 
+@admin.register(VitalDayBlock)
+class VitalDayBlockAdmin(admin.ModelAdmin):
+    list_display = ['user', 'day', 'sample_count', 'first_timestamp', 'last_timestamp']
+    list_filter = ['day']
+    exclude = ['data']
+    ordering = ['-day']
+
 @admin.register(LifestyleRecord)
 class LifestyleRecordAdmin(admin.ModelAdmin):
     list_display = ['user', 'sleep_hours', 'stress_level', 'diet_quality_score', 'timestamp']
@@ -45,3 +84,14 @@ class ExportRequestAdmin(admin.ModelAdmin):
     list_display = ['user', 'format', 'status', 'requested_at']
     list_filter = ['format', 'status']
     ordering = ['-requested_at']
+
+@admin.register(TwinState)
+class TwinStateAdmin(admin.ModelAdmin):
+    list_display = ['user', 'version', 'wellness_score', 'academic_score', 'current_streak', 'updated_at']
+    ordering = ['-updated_at']
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    list_display = ['jti', 'revoked_at', 'expires_at']
+    search_fields = ['jti']
+    ordering = ['-revoked_at']
@@ -0,0 +1,94 @@
+"""
+The sections of the analytics summary.
+
+Each section reads one kind of record with a single aggregate (vitals
+also read their compacted day blocks) and depends on no other section,
+so the async view can run them concurrently. The sync view runs the
+same functions one after another.
+"""
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .filters import user_records
+from .models import VitalRecord, VitalDayBlock, LifestyleRecord, AcademicMetric, Goal
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 3650
+
+
+def parse_days(params):
+    try:
+        days = int(params.get('days', DEFAULT_DAYS))
+    except ValueError:
+        days = -1
+    if days < 0:
+        raise ValidationError({'days': 'Enter a whole number of days.'})
+    if days > MAX_DAYS:
+        raise ValidationError({'days': f'Ensure this value is at most {MAX_DAYS} days.'})
+    return days
+
+
+def vital_summary(user, since):
+    from .vital_blocks import summarize_blocks
+
+    stats = user_records(user, VitalRecord).filter(timestamp__gte=since).aggregate(
+        count=models.Count('id'),
+        heart_rate=models.Sum('heart_rate'),
+        oxygen_saturation=models.Sum('oxygen_saturation'),
+    )
+    # Older readings may have been compacted into per-day blocks
+    block_count, block_sums = summarize_blocks(
+        user_records(user, VitalDayBlock).filter(last_timestamp__gte=since), start=since
+    )
+    count = stats['count'] + block_count
+    heart_rate = (stats['heart_rate'] or 0) + block_sums['heart_rate']
+    oxygen_saturation = (stats['oxygen_saturation'] or 0) + block_sums['oxygen_saturation']
+    return {
+        'count': count,
+        'avg_heart_rate': heart_rate / count if count else None,
+        'avg_spo2': oxygen_saturation / count if count else None,
+    }
+
+
+def lifestyle_summary(user, since):
+    return user_records(user, LifestyleRecord).filter(timestamp__gte=since).aggregate(
+        count=models.Count('id'),
+        avg_sleep=models.Avg('sleep_hours'),
+        avg_stress=models.Avg('stress_level'),
+    )
+
+
+def academic_summary(user, since):
+    return user_records(user, AcademicMetric).filter(timestamp__gte=since).aggregate(
+        count=models.Count('id'),
+        avg_study_hours=models.Avg('study_hours'),
+        avg_attendance=models.Avg('attendance_percentage'),
+    )
+
+
+def goal_summary(user, since):
+    return user_records(user, Goal).aggregate(
+        total=models.Count('id'),
+        active=models.Count('id', filter=models.Q(is_completed=False)),
+        completed=models.Count('id', filter=models.Q(is_completed=True)),
+    )
+
+
+SECTIONS = {
+    'vitals': vital_summary,
+    'lifestyle': lifestyle_summary,
+    'academic': academic_summary,
+    'goals': goal_summary,
+}
+
+
+def period_start(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def summary(user, days):
+    since = period_start(days)
+    return {'period_days': days, **{name: section(user, since) for name, section in SECTIONS.items()}}
@@ -0,0 +1,127 @@
+"""
+Async versions of the read-heavy endpoints, for ASGI deployments
+(digital_twin_backend/asgi.py). They live under /api/async/ and return
+the same bodies as their sync counterparts.
+
+DRF 3.14 has no async views, so these are plain Django async views that
+authenticate the JWT themselves. A slow client then holds a coroutine
+instead of a worker thread. Database reads run through sync_to_async;
+with ASYNC_READS_IN_PARALLEL each one gets its own thread, and therefore
+its own connection, so the sections of the analytics summary run
+concurrently. Connections of those threads are closed after each read
+unless CONN_MAX_AGE keeps them open.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .analytics import SECTIONS, parse_days, period_start
+from .filters import user_records
+from .models import VitalRecord, VitalDayBlock, Goal, AchievementBadge
+from .serializers import VitalRecordSerializer, GoalSerializer, AchievementBadgeSerializer
+
+_jwt_authentication = JWTAuthentication()
+
+
+def _render(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status_code,
+                        content_type='application/json', headers=headers)
+
+
+def _on_own_connection(func):
+    @functools.wraps(func)
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return run
+
+
+async def read(func, *args):
+    """Run the blocking ``func(*args)`` off the event loop."""
+    if settings.ASYNC_READS_IN_PARALLEL:
+        return await sync_to_async(_on_own_connection(func), thread_sensitive=False)(*args)
+    return await sync_to_async(func)(*args)
+
+
+def async_api_view(view):
+    """GET-only, JWT-authenticated async view returning data rendered like DRF would."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method != 'GET':
+                raise MethodNotAllowed(request.method)
+            user_auth = await read(_jwt_authentication.authenticate, request)
+            if user_auth is None:
+                raise NotAuthenticated()
+            request.user = user_auth[0]
+            result = await view(request, *args, **kwargs)
+            return result if isinstance(result, HttpResponse) else _render(result)
+        except APIException as exc:
+            headers = {}
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                headers['WWW-Authenticate'] = _jwt_authentication.authenticate_header(request)
+            elif isinstance(exc, MethodNotAllowed):
+                headers['Allow'] = 'GET'
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return _render(data, exc.status_code, headers)
+    return wrapper
+
+
+def _page(request, queryset, serializer_class):
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(queryset, Request(request))
+    return paginator.get_paginated_response(serializer_class(page, many=True).data).data
+
+
+def _latest_vital(user):
+    from .vital_blocks import latest_record
+
+    record = latest_record(user_records(user, VitalRecord), user_records(user, VitalDayBlock), user)
+    return VitalRecordSerializer(record).data if record else None
+
+
+# ---------------------- ANALYTICS SUMMARY ---------------------- #
+
+@async_api_view
+async def analytics_summary(request):
+    days = parse_days(request.GET)
+    since = period_start(days)
+    results = await asyncio.gather(*(read(section, request.user, since) for section in SECTIONS.values()))
+    return {'period_days': days, **dict(zip(SECTIONS, results))}
+
+# ---------------------- VITAL RECORD ---------------------- #
+
+@async_api_view
+async def vital_latest(request):
+    data = await read(_latest_vital, request.user)
+    if data is None:
+        return _render({'message': 'No vital records found'}, status.HTTP_404_NOT_FOUND)
+    return data
+
+# ---------------------- GOALS ---------------------- #
+
+@async_api_view
+async def goal_list(request):
+    goals = user_records(request.user, Goal)
+    is_completed = request.GET.get('completed')
+    if is_completed is not None:
+        goals = goals.filter(is_completed=is_completed.lower() == 'true')
+    return await read(_page, request, goals, GoalSerializer)
+
+# ---------------------- ACHIEVEMENTS ---------------------- #
+
+@async_api_view
+async def achievement_list(request):
+    return await read(_page, request, user_records(request.user, AchievementBadge), AchievementBadgeSerializer)
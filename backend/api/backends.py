@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Lower
+
+UserModel = get_user_model()
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """
+    Accepts a username or an email address, case-insensitively, found
+    with one query on the lower(username)/lower(email) unique indexes.
+    The password hasher runs exactly once per attempt, including for
+    unknown users, so failures cost and take as long as successes.
+
+    Exact matches win over case-insensitive ones, and usernames over
+    emails, for a login that is one user's username and another's email.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD) or kwargs.get(UserModel.EMAIL_FIELD)
+        if not isinstance(username, str) or not isinstance(password, str):
+            return
+        login = username.lower()
+        user = (
+            UserModel._default_manager
+            .alias(username_lower=Lower('username'), email_lower=Lower('email'))
+            .filter(Q(username_lower=login) | Q(email_lower=login))
+            .annotate(match=Case(
+                When(username=username, then=Value(0)),
+                When(email=username, then=Value(1)),
+                When(username_lower=login, then=Value(2)),
+                default=Value(3),
+                output_field=IntegerField(),
+            ))
+            .order_by('match')
+            .first()
+        )
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user (#20760).
+            UserModel().set_password(password)
+            return
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
@@ -0,0 +1,175 @@
+"""
+Institution-wide columnar export of the record tables (see the export_dataset command).
+
+Users are split into shards; each shard is exported by a worker process
+that streams rows with QuerySet.iterator() (a server-side cursor on
+PostgreSQL) into Arrow record batches, writing one file per table per
+shard: <output>/<table>/part-<shard>.<parquet|arrow>.
+
+Only one export runs at a time: each uses a pool as wide as the machine,
+so the command holds an exclusive lock under DATASET_EXPORT_ROOT for as
+long as it runs.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+EXPORT_CHUNK_SIZE = 20000
+
+# table name -> (model label, [(column, arrow type name)])
+TABLES = {
+    'vitals': ('api.VitalRecord', [
+        ('user_id', 'string'), ('timestamp', 'timestamp'), ('heart_rate', 'int16'),
+        ('blood_pressure_systolic', 'int16'), ('blood_pressure_diastolic', 'int16'),
+        ('temperature', 'float64'), ('oxygen_saturation', 'int16'),
+    ]),
+    'lifestyle': ('api.LifestyleRecord', [
+        ('user_id', 'string'), ('timestamp', 'timestamp'), ('sleep_hours', 'float64'),
+        ('stress_level', 'int16'), ('diet_quality_score', 'int16'), ('water_intake', 'int16'),
+        ('physical_activity_minutes', 'int32'),
+    ]),
+    'academic': ('api.AcademicMetric', [
+        ('user_id', 'string'), ('timestamp', 'timestamp'), ('study_hours', 'float64'),
+        ('attendance_percentage', 'float64'), ('focus_level', 'int16'),
+        ('assignment_completion_rate', 'float64'),
+    ]),
+    'goals': ('api.Goal', [
+        ('user_id', 'string'), ('created_at', 'timestamp'), ('title', 'string'), ('target_value', 'float64'),
+        ('current_value', 'float64'), ('unit', 'string'), ('deadline', 'date32'), ('is_completed', 'bool'),
+    ]),
+}
+
+
+class ExportRunning(Exception):
+    pass
+
+
+def _lock_path():
+    from django.conf import settings
+
+    return os.path.join(settings.DATASET_EXPORT_ROOT, '.export.lock')
+
+
+@contextmanager
+def exclusive_export():
+    """Hold the export lock for the block; raises ExportRunning if another export holds it (POSIX only)."""
+    import fcntl
+
+    os.makedirs(os.path.dirname(_lock_path()), exist_ok=True)
+    with open(_lock_path(), 'a') as lock:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            raise ExportRunning
+        try:
+            yield
+        finally:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def is_export_running():
+    try:
+        with exclusive_export():
+            return False
+    except ExportRunning:
+        return True
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        'string': pa.string(), 'timestamp': pa.timestamp('ms', tz='UTC'), 'date32': pa.date32(),
+        'int16': pa.int16(), 'int32': pa.int32(), 'float64': pa.float64(), 'bool': pa.bool_(),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class _Writer:
+    def __init__(self, path, schema, file_format):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.schema = schema
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(path, schema)
+
+    def write_rows(self, rows):
+        import pyarrow as pa
+
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def write_arrays(self, arrays):
+        import pyarrow as pa
+
+        self._writer.write_batch(pa.RecordBatch.from_arrays(
+            [pa.array(arrays[field.name], type=field.type) for field in self.schema], schema=self.schema
+        ))
+
+    def close(self):
+        self._writer.close()
+
+
+def _export_vital_blocks(writer, alias, user_ids):
+    import numpy as np
+    from .models import VitalDayBlock
+
+    rows = 0
+    blocks = VitalDayBlock.objects.using(alias).filter(user_id__in=user_ids).order_by('user_id', 'day')
+    for block in blocks.iterator(chunk_size=100):
+        arrays = block.arrays()
+        arrays['user_id'] = np.full(block.sample_count, str(block.user_id), dtype=object)
+        arrays['timestamp'] = arrays['timestamp'].astype('datetime64[ms]')
+        writer.write_arrays(arrays)
+        rows += block.sample_count
+    return rows
+
+
+def init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digital_twin_backend.settings')
+    django.setup()
+
+
+def export_shard(shard, user_ids, output_dir, tables, file_format):
+    """Export every requested table for one shard of users. Returns (shard, {table: rows}, seconds)."""
+    from django.apps import apps
+
+    from .sharding import group_by_shard
+
+    started = time.perf_counter()
+    by_shard = group_by_shard(user_ids)
+    counts = {}
+    for table in tables:
+        label, columns = TABLES[table]
+        model = apps.get_model(label)
+        path = os.path.join(output_dir, table, f'part-{shard:05d}.{file_format}')
+        writer = _Writer(path, _arrow_schema(columns), file_format)
+        rows = 0
+        try:
+            for alias, shard_user_ids in by_shard.items():
+                queryset = (model.objects.using(alias).filter(user_id__in=shard_user_ids)
+                            .order_by('user_id', columns[1][0])
+                            .values_list(*[name for name, _ in columns]))
+                batch = []
+                for row in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                    batch.append((str(row[0]),) + row[1:])
+                    if len(batch) >= EXPORT_CHUNK_SIZE:
+                        writer.write_rows(batch)
+                        rows += len(batch)
+                        batch = []
+                if batch:
+                    writer.write_rows(batch)
+                    rows += len(batch)
+                if table == 'vitals':
+                    rows += _export_vital_blocks(writer, alias, shard_user_ids)
+        finally:
+            writer.close()
+        counts[table] = rows
+    return shard, counts, time.perf_counter() - started
@@ -0,0 +1,112 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import sharding
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_current_user_id = ContextVar('current_user_id', default=None)
+# Placement and token revocation lookups must never see replication lag.
+PRIMARY_ONLY_MODELS = {'api.usershard', 'api.revokedtoken'}
+
+
+def set_current_user_id(user_id):
+    return _current_user_id.set(user_id)
+
+
+def reset_current_user_id(token):
+    _current_user_id.reset(token)
+
+
+def set_read_from_replica(value):
+    return _read_from_replica.set(value)
+
+
+def reset_read_from_replica(token):
+    _read_from_replica.reset(token)
+
+
+# Read-your-writes pins travel with the client in a signed cookie, so
+# they hold whichever worker process serves the next request.
+PIN_COOKIE = 'db_pin'
+PIN_SALT = 'api.db_routers.pin'
+
+
+def pin_to_primary(response, user_id):
+    response.set_signed_cookie(PIN_COOKIE, str(user_id), salt=PIN_SALT, max_age=settings.REPLICA_STICKY_SECONDS,
+                               httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE)
+
+
+def is_pinned_to_primary(request, user_id):
+    if user_id is None:
+        return False
+    pinned = request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_SALT,
+                                       max_age=settings.REPLICA_STICKY_SECONDS)
+    return pinned == str(user_id)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to a replica while the current request allows it
+    (see ReplicaRoutingMiddleware); everything else goes to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not _read_from_replica.get():
+            return 'default'
+        # Auth lookups stay on the primary so a freshly created account
+        # can authenticate before replication catches up.
+        if model._meta.label == settings.AUTH_USER_MODEL or model._meta.label_lower in PRIMARY_ONLY_MODELS:
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ShardRouter:
+    """
+    Routes per-user models to the owning user's shard (see api/sharding.py).
+    The user comes from the instance hint when Django provides one, else
+    from the request's user set by UserShardMiddleware. Everything else is
+    left to the next router.
+    """
+
+    def _shard(self, model, hints):
+        if not sharding.is_sharding_enabled() or not sharding.is_sharded(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._state.db and sharding.is_sharded(type(instance)):
+                return instance._state.db
+            user_id = instance.pk if instance._meta.label == settings.AUTH_USER_MODEL else getattr(instance, 'user_id', None)
+        else:
+            user_id = _current_user_id.get()
+        if user_id is None:
+            return None
+        return sharding.shard_for_user(user_id)
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding.is_sharded(type(obj1)) or sharding.is_sharded(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards carry the full schema; sharded tables on them only hold their own users.
+        if db in settings.SHARD_DATABASES:
+            return True
+        return None
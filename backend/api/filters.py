@@ -0,0 +1,115 @@
+import re
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+RELATIVE_RANGE = re.compile(r'^(\d+)([mhdw])$')
+RELATIVE_UNITS = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+READ_ACTIONS = ('list', 'retrieve', 'latest')
+
+
+def parse_timestamp(value, name, end_of_day=False):
+    """Parse an ISO 8601 date or datetime; a bare date covers the whole day."""
+    try:
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day, time.max if end_of_day else time.min)
+        else:
+            parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Enter an ISO 8601 date (YYYY-MM-DD) or datetime.'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_time_range(params):
+    """
+    Return (start, end) from ``start_date``/``end_date`` or a relative
+    ``last`` window such as ``30m``, ``12h``, ``7d`` or ``2w``.
+    """
+    start = end = None
+    last = params.get('last')
+    if last:
+        if params.get('start_date'):
+            raise ValidationError({'last': 'Use either last or start_date, not both.'})
+        match = RELATIVE_RANGE.match(last.strip())
+        if not match:
+            raise ValidationError({'last': 'Use a number followed by m, h, d or w, e.g. 7d.'})
+        amount, unit = match.groups()
+        try:
+            start = timezone.now() - timedelta(**{RELATIVE_UNITS[unit]: int(amount)})
+        except (OverflowError, ValueError):
+            raise ValidationError({'last': 'The window reaches back before the earliest supported date.'})
+    elif params.get('start_date'):
+        start = parse_timestamp(params['start_date'], 'start_date')
+    if params.get('end_date'):
+        end = parse_timestamp(params['end_date'], 'end_date', end_of_day=True)
+    if start and end and start > end:
+        raise ValidationError({'end_date': 'end_date must not be before the start of the range.'})
+    return start, end
+
+
+def user_records(user, model):
+    """
+    ``model`` rows of ``user`` through the reverse relation, so every row
+    gets ``user`` attached without a query (and is routed to the user's shard).
+    """
+    accessor = model._meta.get_field('user').remote_field.get_accessor_name()
+    return getattr(user, accessor).all()
+
+
+class RecordQueryMixin:
+    """
+    Shared by the timestamped record viewsets: validated time range
+    filtering and ``fields=`` projection, which limits both the selected
+    columns (``.only()``) and the serialized payload.
+    """
+
+    def get_time_range(self):
+        if not hasattr(self, '_time_range'):
+            self._time_range = parse_time_range(self.request.query_params)
+        return self._time_range
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            value = self.request.query_params.get('fields')
+            fields = None
+            if value:
+                fields = [field.strip() for field in value.split(',') if field.strip()]
+                allowed = self.serializer_class.Meta.fields
+                unknown = [field for field in fields if field not in allowed]
+                if unknown:
+                    raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}. "
+                                                     f"Choose from: {', '.join(allowed)}."})
+            self._requested_fields = fields
+        return self._requested_fields
+
+    def get_queryset(self):
+        model = self.serializer_class.Meta.model
+        queryset = user_records(self.request.user, model)
+        start, end = self.get_time_range()
+        if start:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end:
+            queryset = queryset.filter(timestamp__lte=end)
+
+        requested = self.get_requested_fields() if self.action in READ_ACTIONS else None
+        if requested:
+            # user_id stays loaded so the request user is attached to each row without a query.
+            columns = {'id', 'user'} | (set(requested) & self._model_columns(model))
+            queryset = queryset.only(*columns)
+        return queryset
+
+    @staticmethod
+    def _model_columns(model):
+        return {field.name for field in model._meta.concrete_fields}
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in READ_ACTIONS:
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
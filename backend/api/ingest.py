@@ -0,0 +1,284 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import twin
+from .models import VitalRecord
+from .sharding import group_by_shard
+
+logger = logging.getLogger(__name__)
+
+VITAL_FIELDS = ['heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+                'temperature', 'oxygen_saturation']
+
+
+def read_segment(path):
+    entries = []
+    with open(path, encoding='utf-8') as segment:
+        for line in segment:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn final line from a crash mid-append was never acknowledged.
+                continue
+    return entries
+
+
+def write_entries(entries):
+    """Insert logged readings; already-inserted keys are skipped, so replays are safe."""
+    user_ids = {entry['user'] for entry in entries}
+    existing = {str(pk) for pk in get_user_model().objects.filter(id__in=user_ids).values_list('id', flat=True)}
+    shards = {str(user_id): alias for alias, ids in group_by_shard(list(existing)).items() for user_id in ids}
+    by_shard = defaultdict(list)
+    for entry in entries:
+        if entry['user'] in existing:
+            by_shard[shards[entry['user']]].append(VitalRecord(
+                ingest_key=entry['key'],
+                user_id=entry['user'],
+                timestamp=parse_datetime(entry['timestamp']),
+                **{field: entry[field] for field in VITAL_FIELDS}
+            ))
+    inserted = 0
+    for alias, records in by_shard.items():
+        with transaction.atomic(using=alias):
+            # Skip readings a previous, interrupted flush already inserted.
+            done = set(VitalRecord.objects.using(alias)
+                       .filter(ingest_key__in=[record.ingest_key for record in records])
+                       .values_list('ingest_key', flat=True))
+            records = [record for record in records if uuid.UUID(record.ingest_key) not in done]
+            VitalRecord.objects.using(alias).bulk_create(
+                records, batch_size=settings.VITAL_INGEST_BATCH_SIZE, ignore_conflicts=True
+            )
+            by_user = defaultdict(list)
+            for record in records:
+                by_user[record.user_id].append(record)
+            for user_id, user_records in by_user.items():
+                twin.apply_records(VitalRecord, user_id, alias, user_records)
+        inserted += len(records)
+    return inserted
+
+
+def _try_lock(file):
+    """Take an exclusive lock on ``file`` without waiting; the OS drops it when the process dies (POSIX only)."""
+    import fcntl
+
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+class VitalIngestBuffer:
+    """
+    Append-only log of accepted vitals, drained into the database in batches.
+
+    Each process appends to its own ``active-*`` segment. A flush rotates it
+    to ``ready-*`` and bulk inserts it; the file is removed only once the
+    insert has committed. Every process holds a lock on its own
+    ``<prefix>.lock`` file for as long as it runs; segments of a prefix
+    whose lock can be taken belong to a dead process and are claimed and
+    replayed. A live process's segments are never claimed, however long
+    its flushes take.
+    """
+
+    def __init__(self, log_dir, batch_size, flush_interval, fsync=True):
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.prefix = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._log = None
+        self._owner_lock = None
+        self._segment = 0
+        self._pending = 0
+
+    def _path(self, state, segment):
+        return os.path.join(self.log_dir, f'{state}-{self.prefix}-{segment:06d}.log')
+
+    def _open_segment(self):
+        self._segment += 1
+        self._log = open(self._path('active', self._segment), 'a', encoding='utf-8')
+
+    def _lock_path(self, prefix):
+        return os.path.join(self.log_dir, f'{prefix}.lock')
+
+    def acquire(self):
+        """Lock this buffer's prefix, marking its segments as owned by a live process."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = self._lock_path(self.prefix)
+        while True:
+            lock = open(path, 'a')
+            if not _try_lock(lock):
+                lock.close()
+                raise RuntimeError(f'Vital ingestion prefix {self.prefix} is locked by another process')
+            try:
+                # Another process may have removed the file between our open and lock; lock the new one then.
+                if os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino:
+                    self._owner_lock = lock
+                    return
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    def release(self):
+        if self._owner_lock is not None:
+            os.remove(self._owner_lock.name)
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    def start(self):
+        self.acquire()
+        self.claim_orphans()
+        with self._lock:
+            self._open_segment()
+        self._thread = threading.Thread(target=self._run, name='vital-ingest-flusher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        with self._lock:
+            # Appends racing with shutdown either made it into the segment or see the buffer stopped.
+            self._close_segment()
+        self.flush()
+        self.release()
+
+    def append(self, user_id, data):
+        entry = {
+            'key': str(uuid.uuid4()),
+            'user': str(user_id),
+            'timestamp': timezone.now().isoformat(),
+        }
+        entry.update({field: data[field] for field in VITAL_FIELDS})
+        line = json.dumps(entry) + '\n'
+        with self._lock:
+            if self._log is None:
+                raise RuntimeError('The vital ingestion buffer is stopped')
+            self._log.write(line)
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self._pending += 1
+            is_full = self._pending >= self.batch_size
+        if is_full:
+            self._wakeup.set()
+        return entry
+
+    def _close_segment(self):
+        """Close the active segment, handing it to flush() if it holds readings. Call with the lock held."""
+        if self._log is None:
+            return
+        self._log.close()
+        if self._pending:
+            os.replace(self._path('active', self._segment), self._path('ready', self._segment))
+            self._pending = 0
+        else:
+            os.remove(self._log.name)
+        self._log = None
+
+    def _rotate(self):
+        with self._lock:
+            if self._log is not None and self._pending:
+                self._close_segment()
+                self._open_segment()
+
+    def flush(self):
+        self._rotate()
+        flushed = 0
+        for name in sorted(os.listdir(self.log_dir)):
+            if name.startswith(f'ready-{self.prefix}-'):
+                path = os.path.join(self.log_dir, name)
+                try:
+                    flushed += write_entries(read_segment(path))
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+        return flushed
+
+    def _owner_is_alive(self, prefix):
+        try:
+            lock = open(self._lock_path(prefix), 'r+')
+        except FileNotFoundError:
+            # Owners create their lock before any segment and remove it after the last one.
+            return False
+        with lock:
+            if not _try_lock(lock):
+                return True
+            # Dead owner: drop its lock file while holding the lock, so no live process can reuse it.
+            try:
+                os.remove(lock.name)
+            except FileNotFoundError:
+                pass
+            return False
+
+    def claim_orphans(self):
+        """Take over the segments of processes that died; returns how many were claimed."""
+        owners = {}
+        for name in sorted(os.listdir(self.log_dir)):
+            if name.endswith('.log'):
+                # <state>-<pid>-<random>-<segment>.log
+                owner = name[:-len('.log')].split('-', 1)[1].rsplit('-', 1)[0]
+                if owner != self.prefix:
+                    owners.setdefault(owner, []).append(name)
+        claimed = 0
+        for owner, names in owners.items():
+            if self._owner_is_alive(owner):
+                continue
+            for name in names:
+                try:
+                    with self._lock:
+                        self._segment += 1
+                        os.replace(os.path.join(self.log_dir, name), self._path('ready', self._segment))
+                    claimed += 1
+                except FileNotFoundError:
+                    # Another process claimed it first.
+                    continue
+        return claimed
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.claim_orphans()
+                self.flush()
+            except Exception:
+                logger.exception('Flushing buffered vitals failed; will retry')
+            finally:
+                close_old_connections()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_vital_buffer():
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = VitalIngestBuffer(
+                log_dir=settings.VITAL_INGEST_LOG_DIR,
+                batch_size=settings.VITAL_INGEST_BATCH_SIZE,
+                flush_interval=settings.VITAL_INGEST_FLUSH_SECONDS,
+                fsync=settings.VITAL_INGEST_FSYNC,
+            )
+            _buffer.start()
+            atexit.register(_buffer.stop)
+        return _buffer
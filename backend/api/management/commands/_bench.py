@@ -0,0 +1,32 @@
+"""Helpers shared by the bench_* commands, which drive the WSGI/ASGI applications in-process."""
+import io
+import statistics
+
+
+def wsgi_request(application, method, path, query='', headers=None, body=b''):
+    """Send one request straight to a WSGI application and return the response status."""
+    status = []
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_LENGTH': str(len(body)), 'CONTENT_TYPE': 'application/json',
+        'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    environ.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in (headers or {}).items()})
+    response = application(environ, lambda line, response_headers: status.append(int(line.split()[0])))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return status[0]
+
+
+def latency_report(label, elapsed, latencies, errors):
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return (
+        f'{label}: {len(latencies)} requests in {elapsed:.2f}s = {len(latencies) / elapsed:.1f} req/s; '
+        f'latency p50 {cuts[49] * 1000:.0f} ms, p95 {cuts[94] * 1000:.0f} ms, p99 {cuts[98] * 1000:.0f} ms, '
+        f'max {max(latencies) * 1000:.0f} ms; {errors} error(s)'
+    )
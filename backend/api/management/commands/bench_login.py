@@ -0,0 +1,78 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from ._bench import latency_report, wsgi_request
+
+USERNAME_PREFIX = 'bench-login-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure login throughput through the WSGI application, the way a semester-start login storm '
+        'hits it: --threads concurrent workers posting to /api/auth/login/ with the configured password '
+        f'hasher. Creates throwaway {USERNAME_PREFIX}<n> users and deletes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--logins', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent logins (worker threads).')
+        parser.add_argument('--by', choices=['username', 'email', 'mixed'], default='mixed',
+                            help='What users log in with; mixed also varies the letter case.')
+        parser.add_argument('--bad-ratio', type=float, default=0.1, help='Share of logins with a wrong password.')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        password = 'bench-login-password'
+        password_hash = make_password(password)
+        started = time.perf_counter()
+        check_password(password, password_hash)
+        hash_seconds = time.perf_counter() - started
+
+        usernames = [f'{USERNAME_PREFIX}{index}' for index in range(options['users'])]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=username, email=f'{username}@example.com', password=password_hash)
+            for username in usernames if username not in existing
+        ])
+
+        bodies = []
+        for index in range(options['logins']):
+            username = random.choice(usernames)
+            by = options['by'] if options['by'] != 'mixed' else random.choice(['username', 'email'])
+            login = username if by == 'username' else f'{username}@example.com'
+            if options['by'] == 'mixed' and index % 2:
+                login = login.upper()
+            wrong = random.random() < options['bad_ratio']
+            bodies.append(json.dumps({by: login, 'password': 'wrong' if wrong else password}).encode())
+
+        application = get_wsgi_application()
+
+        def call(body):
+            started = time.perf_counter()
+            status = wsgi_request(application, 'POST', '/api/auth/login/', body=body)
+            return status, time.perf_counter() - started
+
+        try:
+            call(bodies[0])  # warm up
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                results = list(pool.map(call, bodies))
+            elapsed = time.perf_counter() - started
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__in=usernames).delete()
+
+        expected = [b'"wrong"' not in body for body in bodies]
+        errors = sum((status == 200) != ok for (status, _), ok in zip(results, expected))
+        self.stdout.write(f"Password hasher: {hash_seconds * 1000:.0f} ms per check, "
+                          f"at most {1 / hash_seconds:.0f} logins/s per CPU core")
+        self.stdout.write(latency_report('login', elapsed, [latency for _, latency in results], errors))
@@ -0,0 +1,124 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ._bench import latency_report, wsgi_request
+
+ROUTES = {
+    'analytics': 'analytics/summary/',
+    'latest': 'vitals/latest/',
+    'goals': 'goals/',
+    'achievements': 'achievements/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync stack (WSGI, DRF views, a fixed pool of worker threads) with the async one '
+        '(ASGI, /api/async/ views) under many concurrent slow clients. Runs both in-process against the '
+        'configured database; every client sends --requests requests one after another, each taking '
+        '--client-delay seconds to arrive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username whose data is read.')
+        parser.add_argument('--route', choices=sorted(ROUTES), default='analytics')
+        parser.add_argument('--query', default='', help='Query string, e.g. days=7')
+        parser.add_argument('--clients', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=5, help='Requests per client.')
+        parser.add_argument('--client-delay', type=float, default=0.1,
+                            help='Seconds each request takes to arrive from its client.')
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Worker threads of the sync stack (gunicorn --threads x --workers).')
+        parser.add_argument('--stack', choices=['sync', 'async', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User '{options['user']}' does not exist.")
+        token = str(RefreshToken.for_user(user).access_token)
+        route, query, delay = ROUTES[options['route']], options['query'], options['client_delay']
+
+        stacks = ['sync', 'async'] if options['stack'] == 'both' else [options['stack']]
+        for stack in stacks:
+            if stack == 'sync':
+                pool = ThreadPoolExecutor(max_workers=options['threads'])
+                send = self._sync_sender(pool, f'/api/{route}', query, token, delay)
+            else:
+                pool = None
+                send = self._async_sender(f'/api/async/{route}', query, token, delay)
+            try:
+                elapsed, latencies, errors = asyncio.run(self._run(send, options['clients'], options['requests']))
+            finally:
+                if pool:
+                    pool.shutdown()
+            self._report(stack, elapsed, latencies, errors)
+
+    def _sync_sender(self, pool, path, query, token, delay):
+        application = get_wsgi_application()
+
+        def call():
+            # A sync worker is tied up while the request trickles in
+            time.sleep(delay)
+            return wsgi_request(application, 'GET', path, query, {'Authorization': f'Bearer {token}'})
+
+        async def send():
+            return await asyncio.get_running_loop().run_in_executor(pool, call)
+        return send
+
+    def _async_sender(self, path, query, token, delay):
+        application = get_asgi_application()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': query.encode(), 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        }
+
+        async def send():
+            status = []
+            arrived = False
+
+            async def receive():
+                nonlocal arrived
+                if arrived:
+                    # Nothing more from this client; Django does not ask again before responding.
+                    await asyncio.Future()
+                # Waiting for a slow client only parks this coroutine
+                await asyncio.sleep(delay)
+                arrived = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def respond(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await application(dict(scope), receive, respond)
+            return status[0]
+        return send
+
+    async def _run(self, send, clients, requests):
+        await send()  # warm up
+        latencies, errors = [], 0
+
+        async def client():
+            nonlocal errors
+            for _ in range(requests):
+                started = time.perf_counter()
+                status = await send()
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return time.perf_counter() - started, latencies, errors
+
+    def _report(self, stack, elapsed, latencies, errors):
+        self.stdout.write(latency_report(f'{stack:>5}', elapsed, latencies, errors))
@@ -0,0 +1,23 @@
+import os
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the OpenAPI schema to OPENAPI_SCHEMA_FILE, which /api/schema/ then serves without generating it. '
+        'Run at deploy time, after the code is in place (a stale file serves a stale schema).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=settings.OPENAPI_SCHEMA_FILE)
+        parser.add_argument('--fail-on-warn', action='store_true')
+
+    def handle(self, *args, **options):
+        os.makedirs(os.path.dirname(os.path.abspath(options['file'])), exist_ok=True)
+        call_command('spectacular', file=options['file'], validate=True, fail_on_warn=options['fail_on_warn'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {os.path.getsize(options['file'])} bytes of OpenAPI schema to {options['file']}"
+        ))
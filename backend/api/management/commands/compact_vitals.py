@@ -0,0 +1,52 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.models import VitalRecord
+from api.sharding import shard_for_user
+from api.vital_blocks import compact_day
+
+
+class Command(BaseCommand):
+    help = 'Pack raw vital records of finished days into compact per-day blocks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=1,
+                            help='Number of most recent days (including today) kept as raw rows. Default: 1')
+        parser.add_argument('--user', help='Only compact this username.')
+        parser.add_argument('--dry-run', action='store_true', help='List the user/days that would be compacted.')
+
+    def _user_days(self, cutoff, user):
+        aliases = [shard_for_user(user.pk)] if user else settings.SHARD_DATABASES
+        for alias in aliases:
+            records = VitalRecord.objects.using(alias).filter(timestamp__lt=cutoff)
+            if user:
+                records = records.filter(user=user)
+            yield from (records.annotate(day=TruncDate('timestamp'))
+                        .values_list('user_id', 'day').distinct().order_by('user_id', 'day'))
+
+    def handle(self, *args, **options):
+        if options['keep_days'] < 1:
+            raise CommandError('--keep-days must be at least 1 so the current day stays writable.')
+        today = timezone.now().date()
+        cutoff = datetime.combine(today - timedelta(days=options['keep_days'] - 1), time.min, tzinfo=dt_timezone.utc)
+
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        total = 0
+        for user_id, day in self._user_days(cutoff, user):
+            if options['dry_run']:
+                self.stdout.write(f'{user_id} {day}')
+                continue
+            total += compact_day(user_id, day)
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Compacted {total} vital record(s).'))
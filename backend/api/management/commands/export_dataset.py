@@ -0,0 +1,102 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from api.bulk_export import TABLES, ExportRunning, exclusive_export, export_shard, init_worker
+
+
+class Command(BaseCommand):
+    help = 'Export vitals, lifestyle, academic and goal tables for all users (or a cohort) to Parquet/Arrow files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Output directory. Default: DATASET_EXPORT_ROOT/<timestamp>')
+        parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+        parser.add_argument('--tables', default=','.join(TABLES),
+                            help=f"Comma separated tables to export. Default: {','.join(TABLES)}")
+        parser.add_argument('--users', help='Comma separated usernames to export instead of everyone.')
+        parser.add_argument('--cohort-file', help='File with one user id or username per line.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--users-per-shard', type=int, default=500)
+
+    def _user_ids(self, options):
+        users = get_user_model().objects.order_by('id')
+        wanted = []
+        if options['users']:
+            wanted += [name.strip() for name in options['users'].split(',') if name.strip()]
+        if options['cohort_file']:
+            with open(options['cohort_file'], encoding='utf-8') as cohort:
+                wanted += [line.strip() for line in cohort if line.strip()]
+        if not (options['users'] or options['cohort_file']):
+            return list(users.values_list('id', flat=True))
+
+        ids = set(users.filter(username__in=wanted).values_list('id', flat=True))
+        uuids = []
+        for value in wanted:
+            try:
+                uuids.append(get_user_model()._meta.pk.to_python(value))
+            except ValidationError:
+                continue
+        ids.update(users.filter(id__in=uuids).values_list('id', flat=True))
+        return sorted(ids)
+
+    def handle(self, *args, **options):
+        tables = [table.strip() for table in options['tables'].split(',') if table.strip()]
+        unknown = set(tables) - set(TABLES)
+        if unknown:
+            raise CommandError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise CommandError('pyarrow is required for dataset exports: pip install pyarrow')
+
+        try:
+            with exclusive_export():
+                self._export(tables, options)
+        except ExportRunning:
+            raise CommandError('Another dataset export is running; wait for it to finish.')
+
+    def _export(self, tables, options):
+        user_ids = self._user_ids(options)
+        if not user_ids:
+            raise CommandError('No users matched.')
+        output_dir = options['output'] or os.path.join(
+            settings.DATASET_EXPORT_ROOT, timezone.now().strftime('%Y%m%dT%H%M%S')
+        )
+        size = max(options['users_per_shard'], 1)
+        shards = [user_ids[index:index + size] for index in range(0, len(user_ids), size)]
+        self.stdout.write(f'Exporting {len(user_ids)} user(s) in {len(shards)} shard(s) to {output_dir}')
+
+        # Worker processes must open their own database connections.
+        connections.close_all()
+        started = time.perf_counter()
+        totals = {table: 0 for table in tables}
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1), initializer=init_worker) as pool:
+            futures = [
+                pool.submit(export_shard, index, shard, output_dir, tables, options['format'])
+                for index, shard in enumerate(shards)
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                shard, counts, seconds = future.result()
+                for table, rows in counts.items():
+                    totals[table] += rows
+                elapsed = time.perf_counter() - started
+                total_rows = sum(totals.values())
+                self.stdout.write(
+                    f'[{done}/{len(shards)}] shard {shard}: {sum(counts.values()):,} rows in {seconds:.1f}s '
+                    f'- total {total_rows:,} rows, {total_rows / elapsed:,.0f} rows/s'
+                )
+
+        elapsed = time.perf_counter() - started
+        for table, rows in totals.items():
+            self.stdout.write(f'  {table}: {rows:,} rows')
+        total_rows = sum(totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {total_rows:,} rows in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s) to {output_dir}'
+        ))
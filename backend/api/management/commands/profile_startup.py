@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter, as a new worker would: the WSGI module, then what the first request loads.
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import {wsgi_module}
+loaded = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+routed = time.perf_counter()
+warm_up = None
+if {warm_up!r}:
+    from api.warmup import warm_up
+    warm_up = warm_up()
+done = time.perf_counter()
+sys.stdout.write(json.dumps({{
+    'application': loaded - started, 'urlconf': routed - loaded, 'warm_up': warm_up, 'total': done - started,
+}}))
+'''
+
+
+def parse_importtime(output):
+    """Rows of (module, self seconds, cumulative seconds, depth) from ``python -X importtime`` output."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(own) / 1e6, int(cumulative) / 1e6, depth))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile the cold start of a worker: import cost per package and module (python -X importtime) '
+        'of loading the WSGI application and the URLconf, measured in a fresh interpreter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Rows per table.')
+        parser.add_argument('--warm-up', action='store_true', help='Also run the worker warm-up (api/warmup.py).')
+
+    def handle(self, *args, **options):
+        wsgi_module = settings.WSGI_APPLICATION.rsplit('.', 1)[0]
+        script = STARTUP_SCRIPT.format(wsgi_module=wsgi_module, warm_up=options['warm_up'])
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)}
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=settings.BASE_DIR,
+                                 env=env, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(process.stderr.strip().splitlines()[-1])
+        phases = json.loads(process.stdout.strip().splitlines()[-1])
+        rows = parse_importtime(process.stderr)
+
+        self.stdout.write(
+            f"Startup {phases['total'] * 1000:.0f} ms: application {phases['application'] * 1000:.0f} ms, "
+            f"URLconf {phases['urlconf'] * 1000:.0f} ms"
+            + (f", warm-up {phases['warm_up']['total'] * 1000:.0f} ms" if phases['warm_up'] else '')
+            + f"; {len(rows)} modules imported in {sum(row[1] for row in rows) * 1000:.0f} ms"
+        )
+        if phases['warm_up']:
+            self.stdout.write('  ' + ', '.join(f'{step} {seconds * 1000:.0f} ms'
+                                               for step, seconds in phases['warm_up'].items() if step != 'total'))
+
+        packages = defaultdict(lambda: [0.0, 0])
+        for name, own, _, _ in rows:
+            packages[name.split('.')[0]][0] += own
+            packages[name.split('.')[0]][1] += 1
+        self.stdout.write('\nPackages by import time (own time of all their modules):')
+        for package, (own, count) in sorted(packages.items(), key=lambda item: -item[1][0])[:options['top']]:
+            self.stdout.write(f'  {own * 1000:8.1f} ms  {package} ({count} modules)')
+
+        self.stdout.write('\nModules by cumulative import time (including what they import first):')
+        for name, own, cumulative, depth in sorted(rows, key=lambda row: -row[2])[:options['top']]:
+            self.stdout.write(f'  {cumulative * 1000:8.1f} ms  {name} (own {own * 1000:.1f} ms, depth {depth})')
@@ -0,0 +1,63 @@
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.provisioning import CSV_COLUMNS, PROVISION_CHUNK_SIZE, provision, read_rows
+
+
+def _errors(result):
+    return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in result.get('errors', {}).items())
+
+
+class Command(BaseCommand):
+    help = (
+        f"Create student accounts from a CSV file with columns {', '.join(CSV_COLUMNS)} "
+        "(username and email required; empty passwords are generated). Writes a per-row report CSV, "
+        "which holds generated passwords and tokens, so keep it private."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file')
+        parser.add_argument('--report', help='Report path. Default: <csv_file without .csv>-report.csv')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Password hashing processes.')
+        parser.add_argument('--chunk-size', type=int, default=PROVISION_CHUNK_SIZE)
+        parser.add_argument('--issue-tokens', action='store_true', help='Add an initial JWT pair per user.')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file.')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv_file'], encoding='utf-8-sig', newline='') as source:
+                rows, error = read_rows(source)
+        except OSError as exc:
+            raise CommandError(str(exc))
+        if error:
+            raise CommandError(error)
+
+        started = time.perf_counter()
+        results = provision(rows, workers=max(options['workers'], 1), chunk_size=max(options['chunk_size'], 1),
+                            issue_tokens=options['issue_tokens'], dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - started
+
+        report = options['report'] or f"{os.path.splitext(options['csv_file'])[0]}-report.csv"
+        with open(report, 'w', encoding='utf-8', newline='') as output:
+            writer = csv.writer(output)
+            writer.writerow(['row', 'username', 'email', 'status', 'errors', 'id', 'password', 'refresh', 'access'])
+            for result in results:
+                tokens = result.get('tokens', {})
+                writer.writerow([result['row'], result['username'], result['email'], result['status'], _errors(result),
+                                 result.get('id', ''), result.get('password', ''),
+                                 tokens.get('refresh', ''), tokens.get('access', '')])
+
+        for result in results:
+            if result['status'] == 'failed':
+                self.stdout.write(self.style.WARNING(
+                    f"row {result['row']} ({result['username'] or '-'}): {_errors(result)}"
+                ))
+        succeeded = sum(result['status'] != 'failed' for result in results)
+        verb = 'Validated' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {succeeded} of {len(results)} user(s) in {elapsed:.1f}s; report: {report}'
+        ))
@@ -0,0 +1,86 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api import sharding
+from api.models import UserShard
+
+
+class Command(BaseCommand):
+    help = (
+        "Move users' per-user rows to the shard the hash ring assigns them. "
+        "Run with --init once before enabling SHARD_DATABASE_URLS on an existing database. "
+        "Moving users requires a cache shared by all workers (CACHES) so they see new placements."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--init', action='store_true',
+                            help="Record 'default' as the shard of every user without a placement yet.")
+        parser.add_argument('--user', help='Move only this username (use with --to to choose the shard).')
+        parser.add_argument('--to', help='Target database alias for --user.')
+        parser.add_argument('--purge-orphans', action='store_true',
+                            help='Delete rows left on shards that do not own their user (after interrupted moves).')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change.')
+
+    def handle(self, *args, **options):
+        if options['init']:
+            self._init_placements(options['dry_run'])
+            return
+        if options['to'] and options['to'] not in settings.SHARD_DATABASES:
+            raise CommandError(f"Unknown shard '{options['to']}'. Choose from: {', '.join(settings.SHARD_DATABASES)}")
+        if options['purge_orphans']:
+            self._purge_orphans(options['dry_run'])
+            return
+
+        if not options['dry_run'] and not sharding.placements_are_shared():
+            raise CommandError(
+                'Moving users needs a cache shared by all workers (set CACHE_BACKEND, e.g. RedisCache); '
+                f'with a per-process cache, workers keep using the old shard for up to '
+                f'{sharding.SHARD_CACHE_SECONDS} seconds and their writes would be lost.'
+            )
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(username=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+            moves = [(user.pk, sharding.shard_for_user(user.pk), options['to'] or sharding.get_ring().get(user.pk))]
+        else:
+            ring = sharding.get_ring()
+            moves = [
+                (user_id, alias, ring.get(user_id))
+                for user_id, alias in UserShard.objects.order_by('user_id').values_list('user_id', 'alias')
+                if alias != ring.get(user_id)
+            ]
+
+        for user_id, source, target in moves:
+            if source == target:
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'{user_id}: {source} -> {target}')
+                continue
+            copied = sharding.move_user(user_id, target)
+            self.stdout.write(f'{user_id}: {source} -> {target} ({sum(copied.values())} rows)')
+        self.stdout.write(self.style.SUCCESS(f'{len(moves)} user(s) to move.' if options['dry_run']
+                                             else f'Moved {len(moves)} user(s).'))
+
+    def _init_placements(self, dry_run):
+        placed = UserShard.objects.values_list('user_id', flat=True)
+        missing = list(get_user_model().objects.exclude(pk__in=placed).values_list('pk', flat=True))
+        if not dry_run:
+            UserShard.objects.bulk_create(
+                [UserShard(user_id=user_id, alias='default') for user_id in missing],
+                batch_size=1000, ignore_conflicts=True,
+            )
+        self.stdout.write(self.style.SUCCESS(f"Placed {len(missing)} existing user(s) on 'default'."))
+
+    def _purge_orphans(self, dry_run):
+        placements = {str(user_id): alias for user_id, alias in UserShard.objects.values_list('user_id', 'alias')}
+        for alias in settings.SHARD_DATABASES:
+            for model in sharding.sharded_models():
+                rows = model._base_manager.using(alias)
+                user_ids = rows.values_list('user_id', flat=True).distinct()
+                orphans = [user_id for user_id in user_ids if placements.get(str(user_id), alias) != alias]
+                if orphans:
+                    self.stdout.write(f'{alias} {model._meta.label}: {len(orphans)} orphaned user(s)')
+                    if not dry_run:
+                        rows.filter(user_id__in=orphans).delete()
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api import twin
+from api.models import TwinState
+from api.sharding import group_by_shard
+
+COMPARED_FIELDS = ['latest_vitals', 'latest_lifestyle', 'latest_academic', 'daily', 'averages_7d', 'averages_30d',
+                   'current_streak', 'longest_streak', 'last_active_day', 'wellness_score', 'academic_score', 'goals']
+
+
+class Command(BaseCommand):
+    help = 'Rebuild twin states from the record tables, or with --check report states that drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only this username.')
+        parser.add_argument('--check', action='store_true',
+                            help='Compare stored states with freshly computed ones without saving.')
+
+    def _differences(self, stored, fresh):
+        twin.refresh_derived(stored, fresh.as_of)
+        differences = []
+        for field in COMPARED_FIELDS:
+            old, new = getattr(stored, field), getattr(fresh, field)
+            if field == 'daily':
+                old, new = self._rounded(old), self._rounded(new)
+            if old != new:
+                differences.append(field)
+        return differences
+
+    @staticmethod
+    def _rounded(daily):
+        return {day: {metric: [round(total, 6), count] for metric, (total, count) in bucket.items()}
+                for day, bucket in daily.items()}
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        checked = drifted = 0
+        for alias, user_ids in group_by_shard(list(users.values_list('pk', flat=True))).items():
+            for user_id in user_ids:
+                checked += 1
+                if not options['check']:
+                    twin.rebuild(user_id, alias)
+                    continue
+                stored = TwinState.objects.using(alias).filter(user_id=user_id).first()
+                fresh = twin.build_state(user_id, alias)
+                differences = ['missing'] if stored is None else self._differences(stored, fresh)
+                if differences:
+                    drifted += 1
+                    self.stdout.write(f"{user_id} ({alias}): {', '.join(differences)}")
+
+        if options['check']:
+            style = self.style.SUCCESS if not drifted else self.style.WARNING
+            self.stdout.write(style(f'Checked {checked} twin state(s), {drifted} drifted.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {checked} twin state(s).'))
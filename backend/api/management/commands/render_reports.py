@@ -0,0 +1,100 @@
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api.bulk_export import init_worker
+from api.pdf_reports import claim_pending, mark_completed, mark_failed, prepare_jobs, render_report, requeue_stale
+
+
+class Command(BaseCommand):
+    help = (
+        'Render pending PDF export requests in a process pool, reusing cached chart images. '
+        'Run once per wave, or keep it running next to the web workers with --poll.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--limit', type=int, default=500, help='Requests claimed per wave. Default: 500')
+        parser.add_argument('--poll', type=float, default=0,
+                            help='Seconds to wait for new requests when the queue is empty; 0 runs one wave and exits.')
+        parser.add_argument('--reclaim-after', type=int, default=settings.REPORT_CLAIM_TIMEOUT_SECONDS,
+                            help='Queue again requests left processing this many seconds by a crashed run. '
+                                 'Default: REPORT_CLAIM_TIMEOUT_SECONDS')
+
+    def handle(self, *args, **options):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError('Pillow is required to render PDF reports: pip install Pillow')
+
+        while True:
+            requeued = requeue_stale(options['reclaim_after'])
+            if requeued:
+                self.stdout.write(f'Queued {requeued} abandoned report(s) again')
+            rendered = self._wave(max(options['workers'], 1), max(options['limit'], 1))
+            if not options['poll']:
+                break
+            if not rendered:
+                time.sleep(options['poll'])
+
+    def _wave(self, workers, limit):
+        requests = claim_pending(limit)
+        if not requests:
+            self.stdout.write('No pending PDF reports.')
+            return 0
+        by_id = {request.pk: request for request in requests}
+        started = time.perf_counter()
+        try:
+            jobs = prepare_jobs(requests)
+        except Exception:
+            # Find the request(s) whose data cannot be loaded; the rest still render.
+            jobs = []
+            for request in requests:
+                try:
+                    jobs += prepare_jobs([request])
+                except Exception as exc:
+                    mark_failed(request)
+                    self.stderr.write(f'report {request.pk}: failed to load data: {exc!r}')
+        self.stdout.write(f'Rendering {len(jobs)} report(s) with {workers} worker(s)')
+
+        # Worker processes must open their own database connections.
+        connections.close_all()
+        seconds, charts, cached, failed = [], 0, 0, len(requests) - len(jobs)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = {pool.submit(render_report, job): job for job in jobs}
+            for done, future in enumerate(as_completed(futures), start=1):
+                job = futures[future]
+                request = by_id[job['export_id']]
+                try:
+                    _, report_seconds, report_charts, report_cached = future.result()
+                except Exception as exc:
+                    mark_failed(request)
+                    failed += 1
+                    self.stderr.write(f'[{done}/{len(jobs)}] report {request.pk}: failed: {exc!r}')
+                    continue
+                mark_completed(request, report_seconds)
+                seconds.append(report_seconds)
+                charts += report_charts
+                cached += report_cached
+                self.stdout.write(
+                    f'[{done}/{len(jobs)}] report {request.pk} ({job["summary"]["username"]}): {report_seconds:.2f}s, '
+                    f'{report_cached}/{report_charts} charts from cache'
+                )
+
+        elapsed = time.perf_counter() - started
+        if seconds:
+            cuts = statistics.quantiles(seconds, n=100, method='inclusive') if len(seconds) > 1 else seconds * 99
+            self.stdout.write(
+                f'Render time per report: p50 {cuts[49]:.2f}s, p95 {cuts[94]:.2f}s, max {max(seconds):.2f}s; '
+                f'{cached}/{charts} charts from cache'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {len(seconds)} report(s) in {elapsed:.1f}s ({len(seconds) / elapsed:.1f} reports/s); '
+            f'{failed} failed'
+        ))
+        return len(requests)
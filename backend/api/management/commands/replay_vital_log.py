@@ -0,0 +1,29 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.ingest import VitalIngestBuffer
+
+
+class Command(BaseCommand):
+    help = 'Replay buffered vitals left in the ingestion log by workers that stopped or crashed (live workers keep theirs).'
+
+    def handle(self, *args, **options):
+        log_dir = settings.VITAL_INGEST_LOG_DIR
+        if not os.path.isdir(log_dir):
+            self.stdout.write('No ingestion log directory, nothing to replay.')
+            return
+
+        buffer = VitalIngestBuffer(
+            log_dir=log_dir,
+            batch_size=settings.VITAL_INGEST_BATCH_SIZE,
+            flush_interval=settings.VITAL_INGEST_FLUSH_SECONDS,
+        )
+        buffer.acquire()
+        try:
+            claimed = buffer.claim_orphans()
+            flushed = buffer.flush()
+        finally:
+            buffer.release()
+        self.stdout.write(self.style.SUCCESS(f'Replayed {claimed} segment(s), {flushed} reading(s).'))
@@ -0,0 +1,103 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from . import db_routers
+
+_jwt_authentication = JWTAuthentication()
+
+
+def get_request_user_id(request):
+    """Return the user id carried by the request's access token, without a DB lookup."""
+    if not hasattr(request, '_token_user_id'):
+        request._token_user_id = _token_user_id(request)
+    return request._token_user_id
+
+
+def _token_user_id(request):
+    header = _jwt_authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = _jwt_authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    try:
+        token = _jwt_authentication.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+    return token.get(api_settings.USER_ID_CLAIM)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from replicas, except for users who wrote
+    something within the last REPLICA_STICKY_SECONDS (read-your-writes,
+    tracked by a signed cookie set on the write's response).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._route_reads(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_routers.reset_read_from_replica(token)
+        self._pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = self._route_reads(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_routers.reset_read_from_replica(token)
+        self._pin_after_write(request, response)
+        return response
+
+    def _route_reads(self, request):
+        is_safe = request.method in SAFE_METHODS
+        return db_routers.set_read_from_replica(
+            is_safe and not db_routers.is_pinned_to_primary(request, get_request_user_id(request))
+        )
+
+    def _pin_after_write(self, request, response):
+        user_id = get_request_user_id(request)
+        if request.method not in SAFE_METHODS and user_id is not None and response.status_code < 400:
+            db_routers.pin_to_primary(response, user_id)
+
+
+class UserShardMiddleware:
+    """Makes the requesting user's shard the target for per-user queries without an instance hint."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = db_routers.set_current_user_id(get_request_user_id(request))
+        try:
+            return self.get_response(request)
+        finally:
+            db_routers.reset_current_user_id(token)
+
+    async def __acall__(self, request):
+        token = db_routers.set_current_user_id(get_request_user_id(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            db_routers.reset_current_user_id(token)
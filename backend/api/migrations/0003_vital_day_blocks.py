@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_vital_ingest_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VitalDayBlock',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('sample_count', models.IntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('data', models.BinaryField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vital_blocks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'vital_day_blocks',
+                'ordering': ['-day'],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+    ]
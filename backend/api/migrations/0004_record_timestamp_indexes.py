@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_vital_day_blocks'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='academicmetric',
+            index=models.Index(fields=['user', '-timestamp'], name='academic_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lifestylerecord',
+            index=models.Index(fields=['user', '-timestamp'], name='lifestyle_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vitalrecord',
+            index=models.Index(fields=['user', '-timestamp'], name='vital_user_timestamp_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_user_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TwinState',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='twin_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('latest_vitals', models.JSONField(default=dict)),
+                ('latest_lifestyle', models.JSONField(default=dict)),
+                ('latest_academic', models.JSONField(default=dict)),
+                ('daily', models.JSONField(default=dict)),
+                ('averages_7d', models.JSONField(default=dict)),
+                ('averages_30d', models.JSONField(default=dict)),
+                ('current_streak', models.IntegerField(default=0)),
+                ('longest_streak', models.IntegerField(default=0)),
+                ('last_active_day', models.DateField(blank=True, null=True)),
+                ('wellness_score', models.FloatField(blank=True, null=True)),
+                ('academic_score', models.FloatField(blank=True, null=True)),
+                ('goals', models.JSONField(default=dict)),
+                ('as_of', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'twin_states',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_user_login_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportrequest',
+            name='render_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='exportrequest',
+            index=models.Index(fields=['status', 'format', 'requested_at'], name='export_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:15
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def check_case_duplicates(apps, schema_editor):
+    """Name the accounts that would break the new constraints instead of failing on an opaque IntegrityError."""
+    User = apps.get_model('api', 'User')
+    for field in ('username', 'email'):
+        duplicates = list(
+            User.objects.using(schema_editor.connection.alias)
+            .values(key=django.db.models.functions.text.Lower(field))
+            .annotate(count=models.Count('pk')).filter(count__gt=1).values_list('key', flat=True)[:20]
+        )
+        if duplicates:
+            raise RuntimeError(
+                f"Users whose {field} differs only in case: {', '.join(duplicates)}. "
+                f"Rename or merge these accounts, then migrate again."
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_export_render_seconds'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_case_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='users_username_lower_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='users_email_lower_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('username'), name='users_username_lower_uniq', violation_error_message='A user with that username already exists.'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='users_email_lower_uniq', violation_error_message='A user with that email already exists.'),
+        ),
+    ]
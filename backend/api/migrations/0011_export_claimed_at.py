@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_user_lower_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportrequest',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Lower
+from django.utils import timezone
 import uuid
 
 class User(AbstractUser):
@@ -21,42 +23,95 @@ class User(AbstractUser):
     class Meta:
         db_table = 'users'
         ordering = ['-created_at']
+        constraints = [
+            # Logins match case-insensitively (see api/backends.py), so names must be unique that way too.
+            models.UniqueConstraint(Lower('username'), name='users_username_lower_uniq',
+                                    violation_error_message='A user with that username already exists.'),
+            models.UniqueConstraint(Lower('email'), name='users_email_lower_uniq',
+                                    violation_error_message='A user with that email already exists.'),
+        ]
 
     def __str__(self):
         return self.username
 
 
+class UserShard(models.Model):
+    """Database alias holding a user's per-user rows (see api/sharding.py). Lives on 'default'."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='shard')
+    alias = models.CharField(max_length=50)
+    moved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'user_shards'
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.alias}"
+
+
 class VitalRecord(models.Model):
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vital_records')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vital_records', db_constraint=False)
     heart_rate = models.IntegerField(validators=[MinValueValidator(40), MaxValueValidator(200)])
     blood_pressure_systolic = models.IntegerField(validators=[MinValueValidator(70), MaxValueValidator(200)])
     blood_pressure_diastolic = models.IntegerField(validators=[MinValueValidator(40), MaxValueValidator(130)])
     temperature = models.FloatField(validators=[MinValueValidator(95.0), MaxValueValidator(105.0)])
     oxygen_saturation = models.IntegerField(validators=[MinValueValidator(80), MaxValueValidator(100)])
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # Set for readings accepted through the buffered ingestion log, so replays are idempotent
+    ingest_key = models.UUIDField(null=True, blank=True, unique=True, editable=False)
 
     class Meta:
         db_table = 'vital_records'
         ordering = ['-timestamp']
+        indexes = [models.Index(fields=['user', '-timestamp'], name='vital_user_timestamp_idx')]
 
     def __str__(self):
         return f"{self.user.username} - Vitals - {self.timestamp.date()}"
 
 
+class VitalDayBlock(models.Model):
+    """One user's vitals for one day, compacted into a single blob (see api/vital_blocks.py)."""
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='vital_blocks', db_constraint=False)
+    day = models.DateField()
+    sample_count = models.IntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    data = models.BinaryField()
+
+    class Meta:
+        db_table = 'vital_day_blocks'
+        ordering = ['-day']
+        unique_together = ['user', 'day']
+
+    def __str__(self):
+        return f"{self.user.username} - Vitals block - {self.day} ({self.sample_count} samples)"
+
+    def arrays(self):
+        from .vital_blocks import decode, to_epoch_ms
+        return decode(self.data, self.sample_count, to_epoch_ms(self.first_timestamp))
+
+    def set_arrays(self, arrays):
+        from .vital_blocks import encode, from_epoch_ms
+        first_ms, self.sample_count, self.data = encode(arrays)
+        self.first_timestamp = from_epoch_ms(first_ms)
+        self.last_timestamp = from_epoch_ms(arrays['timestamp'].max())
+
+
 class LifestyleRecord(models.Model):
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lifestyle_records')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lifestyle_records', db_constraint=False)
     sleep_hours = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(24.0)])
     stress_level = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
     diet_quality_score = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
     water_intake = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(30)], default=8)
     physical_activity_minutes = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(1440)], default=0)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'lifestyle_records'
         ordering = ['-timestamp']
+        indexes = [models.Index(fields=['user', '-timestamp'], name='lifestyle_user_timestamp_idx')]
 
     def __str__(self):
         return f"{self.user.username} - Lifestyle - {self.timestamp.date()}"
@@ -64,16 +119,17 @@ class LifestyleRecord(models.Model):
 
 class AcademicMetric(models.Model):
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='academic_metrics')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='academic_metrics', db_constraint=False)
     study_hours = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(24.0)])
     attendance_percentage = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(100.0)])
     focus_level = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)])
     assignment_completion_rate = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(100.0)])
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'academic_metrics'
         ordering = ['-timestamp']
+        indexes = [models.Index(fields=['user', '-timestamp'], name='academic_user_timestamp_idx')]
 
     def __str__(self):
         return f"{self.user.username} - Academic - {self.timestamp.date()}"
@@ -81,7 +137,7 @@ class AcademicMetric(models.Model):
 
 class Goal(models.Model):
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='goals')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='goals', db_constraint=False)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     target_value = models.FloatField()
@@ -89,7 +145,7 @@ class Goal(models.Model):
     unit = models.CharField(max_length=50)
     deadline = models.DateField()
     is_completed = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -107,11 +163,11 @@ class Goal(models.Model):
 
 class AchievementBadge(models.Model):
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='achievements', db_constraint=False)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, default='trophy')
-    earned_at = models.DateTimeField(auto_now_add=True)
+    earned_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         db_table = 'achievement_badges'
@@ -137,16 +193,66 @@ class ExportRequest(models.Model):
     ]
 
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_requests')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_requests', db_constraint=False)
     format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    requested_at = models.DateTimeField(auto_now_add=True)
+    requested_at = models.DateTimeField(default=timezone.now, editable=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     file_url = models.URLField(null=True, blank=True)
+    # Time spent rendering a PDF report, and when render_reports claimed it (see api/pdf_reports.py)
+    render_seconds = models.FloatField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         db_table = 'export_requests'
         ordering = ['-requested_at']
+        # Queue of pending reports picked up by the render_reports command
+        indexes = [models.Index(fields=['status', 'format', 'requested_at'], name='export_queue_idx')]
 
     def __str__(self):
         return f"{self.user.username} - {self.format.upper()} Export - {self.status}"
+
+
+class TwinState(models.Model):
+    """
+    Materialized current state of a student's twin, kept up to date by the
+    record and goal write paths (see api/twin.py). ``daily`` holds per-day
+    [sum, count] buckets for the last 30 days, from which the rolling
+    averages and scores are derived.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='twin_state', db_constraint=False)
+    version = models.PositiveIntegerField(default=0)
+    latest_vitals = models.JSONField(default=dict)
+    latest_lifestyle = models.JSONField(default=dict)
+    latest_academic = models.JSONField(default=dict)
+    daily = models.JSONField(default=dict)
+    averages_7d = models.JSONField(default=dict)
+    averages_30d = models.JSONField(default=dict)
+    current_streak = models.IntegerField(default=0)
+    longest_streak = models.IntegerField(default=0)
+    last_active_day = models.DateField(null=True, blank=True)
+    wellness_score = models.FloatField(null=True, blank=True)
+    academic_score = models.FloatField(null=True, blank=True)
+    goals = models.JSONField(default=dict)
+    as_of = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'twin_states'
+
+    def __str__(self):
+        return f"{self.user_id} - Twin state v{self.version}"
+
+
+class RevokedToken(models.Model):
+    """Refresh token that may no longer be used (see api/token_blacklist.py). Lives on 'default'."""
+    jti = models.CharField(max_length=255, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = 'revoked_tokens'
+
+    def __str__(self):
+        return f"{self.jti} (expires {self.expires_at})"
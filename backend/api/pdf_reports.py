@@ -0,0 +1,332 @@
+"""
+PDF reports for ExportRequests of format 'pdf' (see the render_reports command).
+
+Web workers only queue the request. The render_reports command claims
+pending requests, reads each user's daily series from their TwinState
+(the per-day buckets are already aggregated, so a report costs one
+query however many records the user has) and hands plain-data jobs to a
+process pool, which draws the charts and pages with Pillow.
+
+Each claim records claimed_at. A run that dies mid-wave leaves its
+requests in 'processing'; once REPORT_CLAIM_TIMEOUT_SECONDS have passed
+they go back to 'pending', and a result from the old claim is dropped.
+
+Chart images are cached on disk under REPORT_CHART_CACHE_DIR, keyed by
+user, metric, date range and TwinState.version: a repeat export whose
+data has not changed reuses every chart, and any write to the user's
+records bumps the version, so a stale chart is never served.
+"""
+import os
+import time
+from datetime import date, timedelta
+
+from django.db.models import Q
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import twin
+from .models import ExportRequest, TwinState, User
+
+# A4 at 150 dpi
+PAGE_SIZE = (1240, 1754)
+PAGE_DPI = 150
+MARGIN = 80
+CHART_SIZE = (PAGE_SIZE[0] - 2 * MARGIN, 470)
+CHARTS_PER_PAGE = 3
+
+# metric -> chart title, in report order
+METRICS = {
+    metric: model._meta.get_field(metric).verbose_name.capitalize()
+    for model, (_, metrics) in twin.SOURCES.items()
+    for metric in metrics
+}
+
+# ---- Parent side: queue and data (runs with database access) ---- #
+
+
+def claim_pending(limit):
+    """
+    Claim up to ``limit`` pending PDF requests, oldest first across all
+    shards, by moving them to 'processing'. A request claimed by another
+    render_reports process in the meantime is skipped.
+    """
+    pending = []
+    for alias in settings.SHARD_DATABASES:
+        pending += ExportRequest.objects.using(alias).filter(status='pending', format='pdf') \
+            .order_by('requested_at')[:limit]
+    pending.sort(key=lambda request: request.requested_at)
+    claimed = []
+    for request in pending[:limit]:
+        alias = request._state.db
+        now = timezone.now()
+        if ExportRequest.objects.using(alias).filter(pk=request.pk, status='pending') \
+                .update(status='processing', claimed_at=now):
+            request.status, request.claimed_at = 'processing', now
+            claimed.append(request)
+    return claimed
+
+
+def requeue_stale(timeout):
+    """Put PDF requests claimed more than ``timeout`` seconds ago back in the queue. Returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    requeued = 0
+    for alias in settings.SHARD_DATABASES:
+        requeued += ExportRequest.objects.using(alias) \
+            .filter(Q(claimed_at__lt=cutoff) | Q(claimed_at__isnull=True), status='processing', format='pdf') \
+            .update(status='pending', claimed_at=None)
+    return requeued
+
+
+def report_path(request):
+    """Path of ``request``'s report relative to MEDIA_ROOT (and MEDIA_URL)."""
+    return f'exports/{request.user_id}/pdf/report-{request.pk}.pdf'
+
+
+def _series(state, first_day):
+    series = {}
+    for metric in METRICS:
+        values = []
+        for offset in range(twin.WINDOW_DAYS):
+            total, count = state.daily.get((first_day + timedelta(days=offset)).isoformat(), {}).get(metric, [0, 0])
+            values.append(total / count if count else None)
+        series[metric] = values
+    return series
+
+
+def _summary(user, state):
+    return {
+        'name': user.get_full_name() or user.username,
+        'username': user.username,
+        'wellness_score': state.wellness_score,
+        'academic_score': state.academic_score,
+        'current_streak': state.current_streak,
+        'longest_streak': state.longest_streak,
+        'goals': state.goals,
+        'averages_7d': {metric: state.averages_7d.get(metric) for metric in METRICS},
+        'averages_30d': {metric: state.averages_30d.get(metric) for metric in METRICS},
+    }
+
+
+def prepare_jobs(requests):
+    """
+    Turn claimed requests into render jobs: plain dicts that a worker
+    process renders without touching the database.
+    """
+    users = User.objects.in_bulk({request.user_id for request in requests})
+    by_alias = {}
+    for request in requests:
+        by_alias.setdefault(request._state.db, set()).add(request.user_id)
+    states = {}
+    for alias, user_ids in by_alias.items():
+        states.update(TwinState.objects.using(alias).in_bulk(user_ids))
+
+    today = timezone.now().date()
+    jobs = []
+    for request in requests:
+        state = states.get(request.user_id)
+        if state is None:
+            state = states[request.user_id] = twin.rebuild(request.user_id, request._state.db)
+        elif state.as_of != today:
+            twin.refresh_derived(state, today)
+        first_day = state.as_of - timedelta(days=twin.WINDOW_DAYS - 1)
+        jobs.append({
+            'export_id': request.pk,
+            'user_id': str(request.user_id),
+            'first_day': first_day.isoformat(),
+            'last_day': state.as_of.isoformat(),
+            'version': state.version,
+            'series': _series(state, first_day),
+            'summary': _summary(users[request.user_id], state),
+            'generated_at': timezone.now().strftime('%Y-%m-%d %H:%M UTC'),
+            'output_path': os.path.join(settings.MEDIA_ROOT, report_path(request)),
+            'cache_dir': settings.REPORT_CHART_CACHE_DIR,
+        })
+    return jobs
+
+
+def _claim(request):
+    # Still ours: not re-queued (and perhaps claimed again) since.
+    return ExportRequest.objects.using(request._state.db).filter(
+        pk=request.pk, status='processing', claimed_at=request.claimed_at,
+    )
+
+
+def mark_completed(request, seconds):
+    _claim(request).update(
+        status='completed', completed_at=timezone.now(), render_seconds=round(seconds, 3),
+        file_url=settings.MEDIA_URL + report_path(request),
+    )
+
+
+def mark_failed(request):
+    _claim(request).update(status='failed')
+
+# ---- Worker side: rendering (no database access) ---- #
+
+
+def _font(size):
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, ImportError):
+        # Pillow < 10.1 or built without FreeType: fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def _format(value, digits=1):
+    return '-' if value is None else f'{value:,.{digits}f}'
+
+
+def _save_atomically(image, path, **params):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    image.save(tmp_path, **params)
+    os.replace(tmp_path, path)
+
+
+def draw_chart(title, values, first_day):
+    """Line chart of one metric's daily means; days without data are gaps."""
+    from PIL import Image, ImageDraw
+
+    width, height = CHART_SIZE
+    image = Image.new('RGB', CHART_SIZE, 'white')
+    draw = ImageDraw.Draw(image)
+    label_font, title_font = _font(18), _font(26)
+    left, top, right, bottom = 90, 60, width - 20, height - 50
+    draw.text((0, 10), title, fill='black', font=title_font)
+    draw.rectangle((left, top, right, bottom), outline='#999999')
+
+    present = [value for value in values if value is not None]
+    if not present:
+        draw.text(((left + right) // 2, (top + bottom) // 2), 'No data in this period', fill='#666666',
+                  font=label_font, anchor='mm')
+        return image
+    low, high = min(present), max(present)
+    padding = (high - low) * 0.1 or abs(high) * 0.1 or 1
+    low, high = low - padding, high + padding
+
+    for step in range(5):
+        value = low + (high - low) * step / 4
+        y = bottom - (bottom - top) * step / 4
+        draw.line((left, y, right, y), fill='#e5e5e5')
+        draw.text((left - 10, y), _format(value), fill='#333333', font=label_font, anchor='rm')
+    for offset, anchor in ((0, 'la'), (len(values) // 2, 'ma'), (len(values) - 1, 'ra')):
+        x = left + (right - left) * offset / (len(values) - 1)
+        day = (first_day + timedelta(days=offset)).strftime('%d %b')
+        draw.text((x, bottom + 10), day, fill='#333333', font=label_font, anchor=anchor)
+
+    mean = sum(present) / len(present)
+    mean_y = bottom - (bottom - top) * (mean - low) / (high - low)
+    for x in range(left, right, 16):
+        draw.line((x, mean_y, min(x + 8, right), mean_y), fill='#d9822b', width=2)
+
+    segment = []
+    for offset, value in enumerate(values + [None]):
+        if value is None:
+            if len(segment) > 1:
+                draw.line(segment, fill='#2b6cb0', width=3, joint='curve')
+            segment = []
+            continue
+        point = (left + (right - left) * offset / (len(values) - 1),
+                 bottom - (bottom - top) * (value - low) / (high - low))
+        segment.append(point)
+        draw.ellipse((point[0] - 4, point[1] - 4, point[0] + 4, point[1] + 4), fill='#2b6cb0')
+    return image
+
+
+def _chart(job, metric, first_day):
+    """The chart for ``metric`` from the cache, rendering and caching it on a miss. Returns (image, cached)."""
+    from PIL import Image
+
+    user_dir = os.path.join(job['cache_dir'], job['user_id'])
+    name = f"{metric}_{job['first_day']}_{job['last_day']}_v{job['version']}.png"
+    path = os.path.join(user_dir, name)
+    try:
+        with Image.open(path) as cached:
+            return cached.convert('RGB'), True
+    except OSError:
+        pass
+
+    image = draw_chart(METRICS[metric], job['series'][metric], first_day)
+    _save_atomically(image, path, format='PNG')
+    # Charts of this metric for older versions or ranges can never be hit again.
+    for other in os.listdir(user_dir):
+        if other.endswith('.png') and other.rsplit('_', 3)[0] == metric and other != name:
+            try:
+                os.remove(os.path.join(user_dir, other))
+            except FileNotFoundError:
+                pass
+    return image, False
+
+
+def _summary_page(job):
+    from PIL import Image, ImageDraw
+
+    summary = job['summary']
+    page = Image.new('RGB', PAGE_SIZE, 'white')
+    draw = ImageDraw.Draw(page)
+    heading, font, small = _font(44), _font(24), _font(20)
+    x, y = MARGIN, MARGIN
+    draw.text((x, y), 'Digital Twin Report', fill='black', font=heading)
+    y += 70
+    draw.text((x, y), f"{summary['name']} ({summary['username']})", fill='black', font=font)
+    y += 40
+    draw.text((x, y), f"{job['first_day']} to {job['last_day']} - generated {job['generated_at']}",
+              fill='#555555', font=small)
+    y += 70
+
+    goals = summary['goals'] or {}
+    lines = [
+        ('Wellness score', _format(summary['wellness_score'])),
+        ('Academic score', _format(summary['academic_score'])),
+        ('Current streak', f"{summary['current_streak']} day(s)"),
+        ('Longest streak', f"{summary['longest_streak']} day(s)"),
+        ('Goals', f"{goals.get('active', 0)} active, {goals.get('completed', 0)} completed"),
+        ('Average goal progress', f"{_format(goals.get('average_progress'))}%"),
+        ('Next deadline', goals.get('next_deadline') or '-'),
+    ]
+    for label, value in lines:
+        draw.text((x, y), label, fill='#333333', font=font)
+        draw.text((x + 500, y), value, fill='black', font=font)
+        y += 40
+
+    y += 40
+    columns = (x, x + 640, x + 860)
+    for column, text in zip(columns, ('Metric', '7-day avg', '30-day avg')):
+        draw.text((column, y), text, fill='black', font=font)
+    y += 40
+    draw.line((x, y - 6, PAGE_SIZE[0] - MARGIN, y - 6), fill='#999999')
+    for metric, title in METRICS.items():
+        draw.text((columns[0], y), title, fill='#333333', font=small)
+        draw.text((columns[1], y), _format(summary['averages_7d'][metric], 2), fill='black', font=small)
+        draw.text((columns[2], y), _format(summary['averages_30d'][metric], 2), fill='black', font=small)
+        y += 34
+    return page
+
+
+def render_report(job):
+    """
+    Render one report to job['output_path'].
+    Returns (export_id, seconds, charts, charts taken from the cache).
+    """
+    from PIL import Image
+
+    started = time.perf_counter()
+    first_day = date.fromisoformat(job['first_day'])
+    charts, cached = [], 0
+    for metric in METRICS:
+        image, hit = _chart(job, metric, first_day)
+        charts.append(image)
+        cached += hit
+
+    pages = [_summary_page(job)]
+    for index in range(0, len(charts), CHARTS_PER_PAGE):
+        page = Image.new('RGB', PAGE_SIZE, 'white')
+        for slot, chart in enumerate(charts[index:index + CHARTS_PER_PAGE]):
+            page.paste(chart, (MARGIN, MARGIN + slot * (CHART_SIZE[1] + 60)))
+        pages.append(page)
+    _save_atomically(pages[0], job['output_path'], format='PDF', save_all=True, append_images=pages[1:],
+                     resolution=PAGE_DPI, title=f"Digital Twin Report - {job['summary']['username']}")
+    return job['export_id'], time.perf_counter() - started, len(charts), cached
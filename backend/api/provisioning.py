@@ -0,0 +1,187 @@
+"""
+Bulk creation of student accounts from a CSV file (the provision_users
+command and the admin-only /api/admin/users/bulk/ endpoint).
+
+Hashing the password is nearly all of the cost of creating a user, so
+the command hashes batches large enough to pay for worker start-up in a
+process pool. The endpoint never forks from a (threaded) web worker: it
+hashes in-process, which is why it only takes small files. Users are
+then inserted with bulk_create in chunks. Every row gets a report entry:
+created, or why not (invalid field, duplicate within the file, or
+username/email already taken).
+"""
+import csv
+import io
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+CSV_COLUMNS = ['username', 'email', 'password', 'first_name', 'last_name']
+REQUIRED_COLUMNS = ['username', 'email']
+MIN_PASSWORD_LENGTH = 8
+PROVISION_CHUNK_SIZE = 500
+POOL_MIN_ROWS = 50
+MAX_API_ROWS = 50
+
+
+def read_rows(file):
+    """Parse a CSV (header row required) from a text or binary file. Returns (rows, error)."""
+    data = file.read()
+    if isinstance(data, bytes):
+        try:
+            data = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return [], 'The file must be UTF-8 encoded CSV.'
+    reader = csv.DictReader(io.StringIO(data))
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        return [], f"Missing column(s): {', '.join(missing)}. Expected: {', '.join(CSV_COLUMNS)}."
+    reader.fieldnames = header
+    rows = [{name: (row.get(name) or '').strip() for name in CSV_COLUMNS} for row in reader]
+    return rows, None
+
+
+def _field_errors(row):
+    User = get_user_model()
+    errors = {}
+    checks = {
+        'username': [User.username_validator],
+        'email': [validate_email],
+    }
+    for name, validators in checks.items():
+        if not row[name]:
+            errors[name] = ['This field is required.']
+            continue
+        if len(row[name]) > User._meta.get_field(name).max_length:
+            errors[name] = [f'Ensure this field has at most {User._meta.get_field(name).max_length} characters.']
+            continue
+        for validator in validators:
+            try:
+                validator(row[name])
+            except ValidationError as error:
+                errors.setdefault(name, []).extend(error.messages)
+    if row['password'] and len(row['password']) < MIN_PASSWORD_LENGTH:
+        errors['password'] = [f'Ensure this field has at least {MIN_PASSWORD_LENGTH} characters.']
+    return errors
+
+
+def _taken(field, values):
+    """The lowercased ``values`` already used by an account, ignoring case."""
+    User = get_user_model()
+    taken = set()
+    values = sorted({value.lower() for value in values})
+    for index in range(0, len(values), 1000):
+        taken.update(User.objects.annotate(key=Lower(field)).filter(key__in=values[index:index + 1000])
+                     .values_list('key', flat=True))
+    return taken
+
+
+def validate_rows(rows):
+    """Return one report entry per row; valid rows have no 'errors' key."""
+    results = []
+    first_seen = {'username': {}, 'email': {}}
+    for number, row in enumerate(rows, start=2):
+        result = {'row': number, 'username': row['username'], 'email': row['email']}
+        errors = _field_errors(row)
+        for field in ('username', 'email'):
+            key = row[field].lower()
+            if field not in errors and key in first_seen[field]:
+                errors[field] = [f'Duplicate of row {first_seen[field][key]}.']
+            first_seen[field].setdefault(key, number)
+        if errors:
+            result['errors'] = errors
+        results.append(result)
+
+    valid = [(result, row) for result, row in zip(results, rows) if 'errors' not in result]
+    for field in ('username', 'email'):
+        taken = _taken(field, (row[field] for _, row in valid))
+        for result, row in valid:
+            if row[field].lower() in taken:
+                result.setdefault('errors', {})[field] = [f'A user with that {field} already exists.']
+    return results
+
+
+def init_worker():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'digital_twin_backend.settings')
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """make_password() for every password, in a process pool when the batch is big enough."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_MIN_ROWS:
+        return [make_password(password) for password in passwords]
+    chunksize = max(len(passwords) // (workers * 4), 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def _insert(users, results):
+    """Insert one chunk; if a concurrent signup took a name meanwhile, fall back to row by row."""
+    User = get_user_model()
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create(users)
+        return
+    except IntegrityError:
+        pass
+    for user, result in zip(users, results):
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError:
+            result['errors'] = {'username': ['Username or email was taken while provisioning.']}
+
+
+def provision(rows, workers=None, chunk_size=PROVISION_CHUNK_SIZE, issue_tokens=False, dry_run=False):
+    """
+    Create a user for every valid row. Returns the per-row report: rows
+    that were created have status 'created' (or 'valid' on a dry run),
+    the generated password when the CSV left it empty and, with
+    ``issue_tokens``, an initial JWT pair.
+    """
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    User = get_user_model()
+    results = validate_rows(rows)
+    pending = [(result, row) for result, row in zip(results, rows) if 'errors' not in result]
+    if dry_run:
+        for result, _ in pending:
+            result['status'] = 'valid'
+    else:
+        passwords = []
+        for result, row in pending:
+            if not row['password']:
+                row['password'] = result['password'] = secrets.token_urlsafe(12)
+            passwords.append(row['password'])
+        hashes = hash_passwords(passwords, workers)
+
+        for index in range(0, len(pending), chunk_size):
+            chunk = pending[index:index + chunk_size]
+            users = [
+                User(username=row['username'], email=row['email'], first_name=row['first_name'],
+                     last_name=row['last_name'], password=password_hash)
+                for (_, row), password_hash in zip(chunk, hashes[index:index + chunk_size])
+            ]
+            _insert(users, [result for result, _ in chunk])
+            for user, (result, _) in zip(users, chunk):
+                if 'errors' in result:
+                    result.pop('password', None)
+                    continue
+                result['id'] = str(user.pk)
+                result['status'] = 'created'
+                if issue_tokens:
+                    refresh = RefreshToken.for_user(user)
+                    result['tokens'] = {'refresh': str(refresh), 'access': str(refresh.access_token)}
+    for result in results:
+        result.setdefault('status', 'failed')
+    return results
@@ -0,0 +1,40 @@
+"""
+OpenAPI schema and docs views.
+
+``python manage.py build_schema`` writes the schema to OPENAPI_SCHEMA_FILE
+at deploy time; /api/schema/ then serves that file as is. Only requests
+the file cannot answer (?format=json, ?lang=..., a JSON Accept header)
+or a missing file fall back to generating the schema with drf_spectacular.
+drf_spectacular's views are imported on first use, not at startup.
+"""
+from django.conf import settings
+from django.http import HttpResponse
+
+SCHEMA_CONTENT_TYPE = 'application/vnd.oai.openapi; charset=utf-8'
+
+_static_schema = None
+
+
+def static_schema():
+    """The built schema file's content, or None if it was not built."""
+    global _static_schema
+    if _static_schema is None:
+        try:
+            with open(settings.OPENAPI_SCHEMA_FILE, 'rb') as file:
+                _static_schema = file.read()
+        except FileNotFoundError:
+            return None
+    return _static_schema
+
+
+def schema(request, *args, **kwargs):
+    content = static_schema()
+    if content is not None and not request.GET and 'json' not in request.headers.get('Accept', ''):
+        return HttpResponse(content, content_type=SCHEMA_CONTENT_TYPE)
+    from drf_spectacular.views import SpectacularAPIView
+    return SpectacularAPIView.as_view()(request, *args, **kwargs)
+
+
+def swagger_ui(request, *args, **kwargs):
+    from drf_spectacular.views import SpectacularSwaggerView
+    return SpectacularSwaggerView.as_view(url_name='schema')(request, *args, **kwargs)
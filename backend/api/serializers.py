@@ -1,9 +1,25 @@
+import math
+
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.contrib.auth import get_user_model
-from .models import VitalRecord, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest
+from django.db.models.functions import Lower
+from .models import VitalRecord, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest, TwinState
 
 User = get_user_model()
 
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """Accepts a ``fields`` argument limiting which fields are serialized."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     password_confirm = serializers.CharField(write_only=True)
@@ -11,6 +27,22 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'email', 'password', 'password_confirm', 'first_name', 'last_name']
+        # Uniqueness ignores case, as logins do (see validate_username/validate_email)
+        extra_kwargs = {
+            'username': {'validators': [User.username_validator]},
+            'email': {'validators': []},
+        }
+
+    def _unused(self, field, value):
+        if User.objects.alias(key=Lower(field)).filter(key=value.lower()).exists():
+            raise serializers.ValidationError(f'A user with that {field} already exists.')
+        return value
+
+    def validate_username(self, value):
+        return self._unused('username', value)
+
+    def validate_email(self, value):
+        return self._unused('email', value)
 
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
@@ -28,6 +60,33 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
         return user
 
+class RotatingTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that honours ROTATE_REFRESH_TOKENS/BLACKLIST_AFTER_ROTATION
+    with api/token_blacklist.py: revoked tokens are refused and a rotated
+    token is revoked, so each refresh token can be used once.
+    """
+
+    def validate(self, attrs):
+        from .token_blacklist import is_revoked, revoke
+
+        refresh = self.token_class(attrs['refresh'])
+        jti, exp = refresh[jwt_settings.JTI_CLAIM], refresh['exp']
+        if is_revoked(jti, exp):
+            raise TokenError('Token is blacklisted')
+
+        data = {'access': str(refresh.access_token)}
+        if jwt_settings.ROTATE_REFRESH_TOKENS:
+            # The insert is the check: a concurrent refresh with the same token loses here.
+            if jwt_settings.BLACKLIST_AFTER_ROTATION and not revoke(jti, exp):
+                raise TokenError('Token is blacklisted')
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -40,7 +99,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         model = User
         fields = ['first_name', 'last_name', 'avatar_url', 'theme_preference']
 
-class VitalRecordSerializer(serializers.ModelSerializer):
+class VitalRecordSerializer(DynamicFieldsModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
@@ -55,7 +114,7 @@ class VitalRecordCreateSerializer(serializers.ModelSerializer):
         fields = ['heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
                   'temperature', 'oxygen_saturation']
 
-class LifestyleRecordSerializer(serializers.ModelSerializer):
+class LifestyleRecordSerializer(DynamicFieldsModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
@@ -70,7 +129,7 @@ class LifestyleRecordCreateSerializer(serializers.ModelSerializer):
         fields = ['sleep_hours', 'stress_level', 'diet_quality_score', 
                   'water_intake', 'physical_activity_minutes']
 
-class AcademicMetricSerializer(serializers.ModelSerializer):
+class AcademicMetricSerializer(DynamicFieldsModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
@@ -123,10 +182,56 @@ class ExportRequestSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExportRequest
         fields = ['id', 'user', 'user_username', 'format', 'status', 
-                  'requested_at', 'completed_at', 'file_url']
-        read_only_fields = ['id', 'user', 'status', 'requested_at', 'completed_at', 'file_url']
+                  'requested_at', 'completed_at', 'file_url', 'render_seconds']
+        read_only_fields = ['id', 'user', 'status', 'requested_at', 'completed_at', 'file_url', 'render_seconds']
 
 class ExportRequestCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExportRequest
         fields = ['format']
+
+class TwinStateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TwinState
+        fields = ['version', 'latest_vitals', 'latest_lifestyle', 'latest_academic',
+                  'averages_7d', 'averages_30d', 'current_streak', 'longest_streak', 'last_active_day',
+                  'wellness_score', 'academic_score', 'goals', 'as_of', 'updated_at']
+
+
+class BulkProvisionSerializer(serializers.Serializer):
+    file = serializers.FileField(help_text='CSV with columns username, email, password, first_name, last_name '
+                                           '(username and email required; empty passwords are generated)')
+    issue_tokens = serializers.BooleanField(default=False)
+    dry_run = serializers.BooleanField(default=False)
+
+class SimulationRequestSerializer(serializers.Serializer):
+    changes = serializers.DictField(
+        child=serializers.ListField(child=serializers.FloatField(), min_length=1), allow_empty=False,
+        help_text='Changes to try per lever, relative to the 7-day average, e.g. {"sleep_hours": [0, 0.5, 1]}. '
+                  'Every combination is simulated.'
+    )
+    maximize = serializers.CharField(required=False, help_text='Outcome to pick the best scenario by')
+    minimize = serializers.CharField(required=False, help_text='Outcome to pick the best scenario by')
+
+    def validate(self, attrs):
+        from .simulation import INPUTS, OUTPUTS, MAX_SCENARIOS
+
+        unknown = [name for name in attrs['changes'] if name not in INPUTS]
+        if unknown:
+            raise serializers.ValidationError({'changes': f"Unknown lever(s): {', '.join(unknown)}. "
+                                                          f"Choose from: {', '.join(INPUTS)}."})
+        bad = [name for name, deltas in attrs['changes'].items() if not all(map(math.isfinite, deltas))]
+        if bad:
+            raise serializers.ValidationError({'changes': f"Changes must be finite numbers: {', '.join(bad)}."})
+        combinations = 1
+        for deltas in attrs['changes'].values():
+            combinations *= len(deltas)
+        if combinations > MAX_SCENARIOS:
+            raise serializers.ValidationError({'changes': f'{combinations} combinations requested; '
+                                                          f'the limit is {MAX_SCENARIOS}.'})
+        if 'maximize' in attrs and 'minimize' in attrs:
+            raise serializers.ValidationError({'minimize': 'Use either maximize or minimize, not both.'})
+        for key in ('maximize', 'minimize'):
+            if key in attrs and attrs[key] not in OUTPUTS:
+                raise serializers.ValidationError({key: f"Choose from: {', '.join(OUTPUTS)}."})
+        return attrs
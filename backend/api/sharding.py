@@ -0,0 +1,185 @@
+"""
+Horizontal sharding of per-user data.
+
+Every model in SHARDED_MODELS belongs to exactly one user and lives on
+that user's shard, one of settings.SHARD_DATABASES. New users are placed
+by consistent hashing of their UUID; the placement is then recorded in
+UserShard (on 'default') so adding a shard only moves data when the
+rebalance_shards command says so. The foreign keys of sharded models
+to User are declared without database constraints because the user row
+itself stays on 'default'.
+
+Before enabling shards on an existing database, run
+``manage.py rebalance_shards --init`` so current users keep 'default'.
+"""
+import bisect
+import hashlib
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.utils import timezone
+
+SHARDED_MODELS = [
+    'api.VitalRecord',
+    'api.VitalDayBlock',
+    'api.LifestyleRecord',
+    'api.AcademicMetric',
+    'api.Goal',
+    'api.AchievementBadge',
+    'api.ExportRequest',
+    'api.TwinState',
+]
+SHARDED_MODEL_LABELS = {label.lower() for label in SHARDED_MODELS}
+SHARD_CACHE_SECONDS = 300
+
+
+class HashRing:
+    def __init__(self, nodes, virtual_nodes=64):
+        self._ring = sorted(
+            (self._hash(f'{node}#{index}'), node) for node in nodes for index in range(virtual_nodes)
+        )
+        self._keys = [key for key, _ in self._ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def get(self, key):
+        index = bisect.bisect(self._keys, self._hash(str(key))) % len(self._keys)
+        return self._ring[index][1]
+
+
+@lru_cache(maxsize=None)
+def _ring(aliases):
+    return HashRing(aliases)
+
+
+def get_ring():
+    return _ring(tuple(settings.SHARD_DATABASES))
+
+
+def is_sharding_enabled():
+    return len(settings.SHARD_DATABASES) > 1
+
+
+def is_sharded(model):
+    return model._meta.label_lower in SHARDED_MODEL_LABELS
+
+
+def sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+
+def _cache_key(user_id):
+    return f'user-shard:{user_id}'
+
+
+def placements_are_shared():
+    """
+    Whether cached placements are shared by every worker (or not cached at
+    all), so that a move takes effect everywhere at once. A per-process
+    LocMem cache would keep sending a moved user's requests to the old
+    shard for up to SHARD_CACHE_SECONDS.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def shard_for_user(user_id):
+    """Return the database alias holding ``user_id``'s rows, assigning one on first use."""
+    if not is_sharding_enabled():
+        return 'default'
+    key = _cache_key(user_id)
+    alias = cache.get(key)
+    if alias is None:
+        from .models import UserShard
+
+        placement, _ = UserShard.objects.get_or_create(user_id=user_id, defaults={'alias': get_ring().get(user_id)})
+        alias = placement.alias
+        cache.set(key, alias, SHARD_CACHE_SECONDS)
+    return alias
+
+
+def group_by_shard(user_ids):
+    """Return {alias: [user_id, ...]} with one placement query for the whole batch."""
+    if not is_sharding_enabled():
+        return {'default': list(user_ids)} if user_ids else {}
+    from .models import UserShard
+
+    placements = {
+        str(user_id): alias
+        for user_id, alias in UserShard.objects.filter(user_id__in=user_ids).values_list('user_id', 'alias')
+    }
+    groups = {}
+    for user_id in user_ids:
+        alias = placements.get(str(user_id)) or shard_for_user(user_id)
+        groups.setdefault(alias, []).append(user_id)
+    return groups
+
+
+def _copy_rows(model, user_id, source, target):
+    auto_now = [field.attname for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+    # Surrogate keys are reassigned on the target; keys that are the user (TwinState) are kept.
+    new_pk = isinstance(model._meta.pk, models.AutoField)
+    copied = 0
+    batch = []
+    for obj in model._base_manager.using(source).filter(user_id=user_id).order_by('pk').iterator(chunk_size=2000):
+        if new_pk:
+            obj.pk = None
+        obj._state.adding = True
+        batch.append(obj)
+        if len(batch) >= 2000:
+            copied += _insert(model, batch, target, auto_now)
+            batch = []
+    if batch:
+        copied += _insert(model, batch, target, auto_now)
+    return copied
+
+
+def _insert(model, objs, target, auto_now):
+    originals = [{name: getattr(obj, name) for name in auto_now} for obj in objs]
+    model._base_manager.using(target).bulk_create(objs)
+    # bulk_create refreshes auto_now fields; put the original values back.
+    for obj, values in zip(objs, originals):
+        if values and obj.pk is not None:
+            model._base_manager.using(target).filter(pk=obj.pk).update(**values)
+    return len(objs)
+
+
+def delete_user_rows(user_id, alias):
+    for model in sharded_models():
+        model._base_manager.using(alias).filter(user_id=user_id).delete()
+
+
+def move_user(user_id, target):
+    """
+    Copy a user's rows to ``target``, switch their placement and delete the
+    old copies. Rows get new primary keys on the target shard. Writes the
+    user makes while the copy runs are not carried over, so move users
+    while they are idle. Refuses to run unless placements_are_shared().
+    """
+    from .models import UserShard
+
+    if not placements_are_shared():
+        raise ImproperlyConfigured(
+            'Moving users needs a cache shared by all workers (CACHE_BACKEND), or workers keep using '
+            f'the old shard for up to {SHARD_CACHE_SECONDS} seconds.'
+        )
+
+    source = shard_for_user(user_id)
+    if source == target:
+        return {}
+    # Leftovers from an interrupted move are not live data on the target.
+    delete_user_rows(user_id, target)
+    copied = {}
+    with transaction.atomic(using=target):
+        for model in sharded_models():
+            copied[model._meta.label] = _copy_rows(model, user_id, source, target)
+    UserShard.objects.update_or_create(user_id=user_id, defaults={'alias': target, 'moved_at': timezone.now()})
+    cache.delete(_cache_key(user_id))
+    delete_user_rows(user_id, source)
+    return copied
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import sharding, twin
+from .models import VitalRecord, LifestyleRecord, AcademicMetric, Goal
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def delete_sharded_rows(sender, instance, using, **kwargs):
+    # Django's cascade only reaches rows on the database the user is deleted from.
+    alias = sharding.shard_for_user(instance.pk)
+    if alias != using:
+        sharding.delete_user_rows(instance.pk, alias)
+
+
+def _is_single_row_change(instance, origin):
+    # Bulk deletes (compaction, shard moves, cascades from a deleted user) are not twin changes.
+    return origin is None or origin is instance
+
+
+@receiver(post_save, sender=VitalRecord)
+@receiver(post_save, sender=LifestyleRecord)
+@receiver(post_save, sender=AcademicMetric)
+def update_twin_on_record_save(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    if created:
+        twin.apply_records(sender, instance.user_id, using, [instance])
+    else:
+        twin.rebuild(instance.user_id, using)
+
+
+@receiver(post_delete, sender=VitalRecord)
+@receiver(post_delete, sender=LifestyleRecord)
+@receiver(post_delete, sender=AcademicMetric)
+def update_twin_on_record_delete(sender, instance, using, origin=None, **kwargs):
+    if _is_single_row_change(instance, origin):
+        twin.rebuild(instance.user_id, using)
+
+
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def update_twin_on_goal_change(sender, instance, using, raw=False, origin=None, **kwargs):
+    if not raw and _is_single_row_change(instance, origin):
+        twin.refresh_goals(instance.user_id, using)
@@ -0,0 +1,227 @@
+"""
+What-if simulation over a student's twin.
+
+A ridge regression per outcome is fitted on the student's daily history.
+Each row is one day: daily means of the lifestyle and academic records
+and, when the day has readings, the vitals. A model is cached until the
+twin state version changes, i.e. until the user writes something. A
+scenario grid is the cartesian product of per-lever changes around the
+7-day baseline, and it is evaluated with one matrix product however many
+combinations it has.
+"""
+import itertools
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import VitalRecord, VitalDayBlock, LifestyleRecord, AcademicMetric
+
+# Levers a scenario may change, and the outcomes predicted from them
+INPUTS = {
+    'sleep_hours': LifestyleRecord,
+    'physical_activity_minutes': LifestyleRecord,
+    'water_intake': LifestyleRecord,
+    'diet_quality_score': LifestyleRecord,
+    'study_hours': AcademicMetric,
+}
+OUTPUTS = {
+    'focus_level': AcademicMetric,
+    'assignment_completion_rate': AcademicMetric,
+    'stress_level': LifestyleRecord,
+    'heart_rate': VitalRecord,
+}
+HISTORY_DAYS = 365
+RIDGE_ALPHA = 1.0
+MIN_CONFIDENT_DAYS = 14
+MAX_SCENARIOS = 20000
+MODEL_CACHE_SECONDS = 24 * 60 * 60
+
+
+def _bounds(model, name):
+    low, high = -np.inf, np.inf
+    for validator in model._meta.get_field(name).validators:
+        if isinstance(validator, MinValueValidator):
+            low = validator.limit_value
+        elif isinstance(validator, MaxValueValidator):
+            high = validator.limit_value
+    return low, high
+
+
+INPUT_BOUNDS = np.array([_bounds(model, name) for name, model in INPUTS.items()]).T
+OUTPUT_BOUNDS = np.array([_bounds(model, name) for name, model in OUTPUTS.items()]).T
+
+
+def _daily_means(model, fields, user_id, alias, since):
+    rows = (model.objects.using(alias).filter(user_id=user_id, timestamp__gte=since)
+            .annotate(day=TruncDate('timestamp')).values('day')
+            .annotate(**{f'{name}_avg': models.Avg(name) for name in fields}).order_by())
+    return {row['day']: [row[f'{name}_avg'] for name in fields] for row in rows}
+
+
+def _daily_heart_rate(user_id, alias, since):
+    rows = (VitalRecord.objects.using(alias).filter(user_id=user_id, timestamp__gte=since)
+            .annotate(day=TruncDate('timestamp')).values('day')
+            .annotate(total=models.Sum('heart_rate'), samples=models.Count('id')).order_by())
+    totals = {row['day']: [row['total'], row['samples']] for row in rows}
+    for block in VitalDayBlock.objects.using(alias).filter(user_id=user_id, day__gte=since.date()):
+        heart_rate = block.arrays()['heart_rate']
+        total = totals.setdefault(block.day, [0, 0])
+        total[0] += int(heart_rate.sum())
+        total[1] += len(heart_rate)
+    return {day: total / samples for day, (total, samples) in totals.items() if samples}
+
+
+def daily_history(user_id, alias):
+    """
+    Return (X, Y): one row per day with both lifestyle and academic
+    records, INPUTS columns in X and OUTPUTS columns in Y (NaN where the
+    day has no reading for an outcome).
+    """
+    since = timezone.now() - timedelta(days=HISTORY_DAYS)
+    lifestyle_fields = [name for name, model in itertools.chain(INPUTS.items(), OUTPUTS.items())
+                        if model is LifestyleRecord]
+    academic_fields = [name for name, model in itertools.chain(INPUTS.items(), OUTPUTS.items())
+                       if model is AcademicMetric]
+    lifestyle = _daily_means(LifestyleRecord, lifestyle_fields, user_id, alias, since)
+    academic = _daily_means(AcademicMetric, academic_fields, user_id, alias, since)
+    heart_rate = _daily_heart_rate(user_id, alias, since)
+
+    days = sorted(set(lifestyle) & set(academic))
+    rows = []
+    for day in days:
+        values = dict(zip(lifestyle_fields, lifestyle[day]))
+        values.update(zip(academic_fields, academic[day]))
+        values['heart_rate'] = heart_rate.get(day)
+        rows.append(values)
+    X = np.array([[row[name] for name in INPUTS] for row in rows], dtype=float).reshape(len(rows), len(INPUTS))
+    Y = np.array([[np.nan if row[name] is None else row[name] for name in OUTPUTS] for row in rows],
+                 dtype=float).reshape(len(rows), len(OUTPUTS))
+    return X, Y
+
+
+class ResponseModel:
+    """Ridge regressions of every outcome on the standardized inputs."""
+
+    def __init__(self, X, Y, alpha=RIDGE_ALPHA):
+        self.days = len(X)
+        self.mean = X.mean(axis=0) if self.days else np.zeros(X.shape[1])
+        scale = X.std(axis=0) if self.days else np.ones(X.shape[1])
+        self.scale = np.where(scale > 0, scale, 1.0)
+        self.coef = np.zeros((X.shape[1], Y.shape[1]))
+        self.intercept = np.full(Y.shape[1], np.nan)
+        self.r2 = np.full(Y.shape[1], np.nan)
+        self.samples = np.zeros(Y.shape[1], dtype=int)
+
+        standardized = (X - self.mean) / self.scale
+        for index in range(Y.shape[1]):
+            observed = ~np.isnan(Y[:, index])
+            self.samples[index] = observed.sum()
+            if not self.samples[index]:
+                continue
+            x, y = standardized[observed], Y[observed, index]
+            self.intercept[index] = y.mean()
+            self.coef[:, index] = np.linalg.solve(x.T @ x + alpha * np.eye(x.shape[1]), x.T @ (y - y.mean()))
+            residual = y - self.intercept[index] - x @ self.coef[:, index]
+            spread = ((y - y.mean()) ** 2).sum()
+            self.r2[index] = 1 - (residual ** 2).sum() / spread if spread > 0 else 0.0
+
+    @property
+    def fitted(self):
+        return ~np.isnan(self.intercept)
+
+    def predict(self, X):
+        """Outcomes for every row of ``X`` (scenarios x INPUTS), clipped to their valid ranges."""
+        predicted = ((X - self.mean) / self.scale) @ self.coef + self.intercept
+        return np.clip(predicted, OUTPUT_BOUNDS[0], OUTPUT_BOUNDS[1])
+
+    def effects(self):
+        """Change in each outcome per unit of each input."""
+        return self.coef / self.scale[:, np.newaxis]
+
+
+def _cache_key(user_id, version):
+    return f'twin-model:{user_id}:{version}'
+
+
+def get_model(user_id, alias, version):
+    """The user's fitted model, refitted only when their twin state version changes."""
+    key = _cache_key(user_id, version)
+    model = cache.get(key)
+    if model is None:
+        model = ResponseModel(*daily_history(user_id, alias))
+        cache.set(key, model, MODEL_CACHE_SECONDS)
+    return model
+
+
+def baseline_inputs(state, model):
+    """The user's recent levels: 7-day averages, else 30-day, else the training means."""
+    values = []
+    for index, name in enumerate(INPUTS):
+        value = state.averages_7d.get(name, state.averages_30d.get(name))
+        values.append(model.mean[index] if value is None else value)
+    return np.array(values, dtype=float)
+
+
+def scenario_grid(baseline, changes):
+    """Rows of inputs for every combination of ``changes`` ({input: [delta, ...]}), clipped to valid ranges."""
+    names = list(changes)
+    deltas = np.meshgrid(*(np.asarray(changes[name], dtype=float) for name in names), indexing='ij')
+    grid = np.tile(baseline, (deltas[0].size if names else 1, 1))
+    for name, delta in zip(names, deltas):
+        grid[:, list(INPUTS).index(name)] += delta.ravel()
+    return np.clip(grid, INPUT_BOUNDS[0], INPUT_BOUNDS[1])
+
+
+def _round(values):
+    return np.round(values, 2).tolist()
+
+
+def simulate(state, alias, changes, maximize=None, minimize=None):
+    """Evaluate the scenario grid for the owner of ``state``; returns the API response body."""
+    model = get_model(state.user_id, alias, state.version)
+    if not model.days:
+        raise ValidationError({'error': 'Log lifestyle and academic records on the same days before simulating.'})
+    outputs = [name for name, fitted in zip(OUTPUTS, model.fitted) if fitted]
+    columns = [list(OUTPUTS).index(name) for name in outputs]
+    baseline = baseline_inputs(state, model)
+    grid = scenario_grid(baseline, changes)
+    predicted = model.predict(grid)[:, columns]
+    expected = model.predict(baseline[np.newaxis, :])[0, columns]
+
+    result = {
+        'baseline': {
+            'inputs': dict(zip(INPUTS, _round(baseline))),
+            'outputs': dict(zip(outputs, _round(expected))),
+        },
+        'scenarios': {
+            'count': len(grid),
+            'inputs': {name: _round(grid[:, list(INPUTS).index(name)]) for name in changes},
+            'outputs': {name: _round(predicted[:, index]) for index, name in enumerate(outputs)},
+        },
+        'model': {
+            'version': state.version,
+            'history_days': model.days,
+            'confident': model.days >= MIN_CONFIDENT_DAYS,
+            'r2': {name: round(float(model.r2[column]), 3) for name, column in zip(outputs, columns)},
+            'effects_per_unit': {
+                name: dict(zip(INPUTS, np.round(model.effects()[:, column], 4).tolist()))
+                for name, column in zip(outputs, columns)
+            },
+        },
+    }
+    objective = maximize or minimize
+    if objective in outputs:
+        values = predicted[:, outputs.index(objective)]
+        best = int(values.argmax() if maximize else values.argmin())
+        result['best'] = {
+            'index': best,
+            'inputs': {name: round(float(grid[best, list(INPUTS).index(name)]), 2) for name in INPUTS},
+            'outputs': {name: round(float(predicted[best, index]), 2) for index, name in enumerate(outputs)},
+        }
+    return result
@@ -0,0 +1,69 @@
+"""
+Realistic per-user data for the performance tests: records spread over
+the last 60 days (the oldest vitals compacted into day blocks), goals,
+badges, exports and a built twin state.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from api import twin
+from api.models import VitalRecord, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest
+from api.sharding import shard_for_user
+from api.vital_blocks import compact_day
+
+PASSWORD = 'perf-test-password'
+HISTORY_DAYS = 60
+COMPACTED_DAYS = 2
+
+
+def seed_user(username, size):
+    """Create a user with ``size`` rows of each record type and a few of everything else."""
+    user = get_user_model().objects.create_user(username=username, email=f'{username}@example.com',
+                                                password=PASSWORD)
+    rng = random.Random(username)
+    now = timezone.now()
+    # The newest reading is always recent, so range queries never come back empty.
+    timestamps = [now - timedelta(minutes=1)] + sorted(
+        (now - timedelta(minutes=rng.randrange(HISTORY_DAYS * 24 * 60)) for _ in range(size - 1)), reverse=True
+    )
+    alias = shard_for_user(user.pk)
+
+    VitalRecord.objects.using(alias).bulk_create([
+        VitalRecord(user=user, timestamp=timestamp, heart_rate=rng.randint(55, 110),
+                    blood_pressure_systolic=rng.randint(100, 140), blood_pressure_diastolic=rng.randint(60, 90),
+                    temperature=round(rng.uniform(97.0, 99.5), 1), oxygen_saturation=rng.randint(94, 100))
+        for timestamp in timestamps
+    ])
+    LifestyleRecord.objects.using(alias).bulk_create([
+        LifestyleRecord(user=user, timestamp=timestamp, sleep_hours=round(rng.uniform(4, 10), 1),
+                        stress_level=rng.randint(1, 10), diet_quality_score=rng.randint(1, 10),
+                        water_intake=rng.randint(2, 12), physical_activity_minutes=rng.randint(0, 90))
+        for timestamp in timestamps
+    ])
+    AcademicMetric.objects.using(alias).bulk_create([
+        AcademicMetric(user=user, timestamp=timestamp, study_hours=round(rng.uniform(0, 8), 1),
+                       attendance_percentage=rng.uniform(50, 100), focus_level=rng.randint(1, 10),
+                       assignment_completion_rate=rng.uniform(40, 100))
+        for timestamp in timestamps
+    ])
+    goal_count = max(1, size // 10)
+    Goal.objects.using(alias).bulk_create([
+        Goal(user=user, title=f'Goal {index}', target_value=10, current_value=rng.randint(0, 10), unit='hours',
+             deadline=now.date() + timedelta(days=30), is_completed=index % 3 == 2)
+        for index in range(goal_count)
+    ])
+    AchievementBadge.objects.using(alias).bulk_create([
+        AchievementBadge(user=user, name=f'Badge {index}') for index in range(goal_count)
+    ])
+    ExportRequest.objects.using(alias).bulk_create([
+        ExportRequest(user=user, format='csv', status='completed') for _ in range(goal_count)
+    ])
+
+    if size > 1:
+        for days_ago in range(HISTORY_DAYS - COMPACTED_DAYS, HISTORY_DAYS + 1):
+            compact_day(user.pk, (now - timedelta(days=days_ago)).date())
+    twin.rebuild(user.pk, alias)
+    return user
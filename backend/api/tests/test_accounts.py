@@ -0,0 +1,54 @@
+"""Usernames and emails are unique ignoring case, as logins match them."""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+PASSWORD = 'correct-horse'
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AccountTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = APIClient(HTTP_HOST='localhost')
+        self.bob = get_user_model().objects.create_user(username='bob', email='bob@example.com', password=PASSWORD)
+
+    def login(self, **body):
+        return self.client.post(reverse('login'), body, format='json')
+
+    def test_signup_refuses_case_variants(self):
+        for username, email, field in [('Bob', 'robert@example.com', 'username'),
+                                       ('robert', 'BOB@example.com', 'email')]:
+            with self.subTest(field):
+                response = self.client.post(reverse('signup'), {
+                    'username': username, 'email': email, 'password': PASSWORD, 'password_confirm': PASSWORD,
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {field: [f'A user with that {field} already exists.']})
+        self.assertEqual(self.login(email='bob@example.com', password=PASSWORD).status_code, 200)
+
+    def test_database_refuses_case_variants(self):
+        User = get_user_model()
+        for fields in ({'username': 'BOB', 'email': 'other@example.com'}, {'username': 'other', 'email': 'Bob@Example.com'}):
+            with self.subTest(fields), self.assertRaises(IntegrityError), transaction.atomic():
+                User.objects.create_user(password=PASSWORD, **fields)
+
+    def test_exact_matches_win(self):
+        # One user's username is another user's email, in another case.
+        other = get_user_model().objects.create_user(username='Carol@example.com', email='carol1@example.com',
+                                                      password=PASSWORD)
+        carol = get_user_model().objects.create_user(username='carol', email='carol@example.com', password=PASSWORD)
+        for login, user in [('Carol@example.com', other), ('carol@example.com', carol), ('CAROL@EXAMPLE.COM', other)]:
+            with self.subTest(login):
+                response = self.login(username=login, password=PASSWORD)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['user']['id'], str(user.pk))
+
+    def test_malformed_credentials(self):
+        for body in ({'username': 123, 'password': PASSWORD}, {'username': ['bob'], 'password': PASSWORD},
+                     {'username': 'bob', 'password': {'value': PASSWORD}}):
+            with self.subTest(body):
+                self.assertEqual(self.login(**body).status_code, 401)
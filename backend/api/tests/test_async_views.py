@@ -0,0 +1,63 @@
+"""
+The async views under /api/async/ answer exactly like their sync
+counterparts. This runs with parallel reads, so data is committed
+(TransactionTestCase) where the reads' own connections can see it.
+"""
+import json
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .seed import seed_user
+
+# (async url name, sync url name, query string)
+PAIRS = [
+    ('async-analytics-summary', 'analytics-summary', ''),
+    ('async-analytics-summary', 'analytics-summary', '?days=7'),
+    ('async-vital-latest', 'vital-latest', ''),
+    ('async-goal-list', 'goal-list', ''),
+    ('async-goal-list', 'goal-list', '?completed=true&page=2'),
+    ('async-achievement-list', 'achievement-list', ''),
+]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], ASYNC_READS_IN_PARALLEL=True)
+class AsyncViewTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = seed_user('asyncreader', 40)
+        # Small pages, so that the paginated routes have a next and a previous page
+        patcher = mock.patch.object(PageNumberPagination, 'page_size', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient(HTTP_HOST='localhost')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_same_responses_as_sync_views(self):
+        for async_name, sync_name, query in PAIRS:
+            with self.subTest(route=async_name, query=query):
+                expected = self.client.get(reverse(sync_name) + query)
+                response = self.client.get(reverse(async_name) + query)
+                self.assertEqual(response.status_code, expected.status_code)
+                # Page links point back at the route that was called
+                self.assertEqual(json.loads(response.content.decode().replace('/api/async/', '/api/')), expected.json())
+
+    def test_errors(self):
+        for name in ('async-analytics-summary', 'analytics-summary'):
+            for days in ('soon', '-1', '1000000', '99999999999999999999'):
+                with self.subTest(route=name, days=days):
+                    response = self.client.get(reverse(name), {'days': days})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('days', response.json())
+        self.assertEqual(self.client.post(reverse('async-goal-list')).status_code, 405)
+        self.client.credentials()
+        response = self.client.get(reverse('async-goal-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer nonsense')
+        self.assertEqual(self.client.get(reverse('async-vital-latest')).json()['code'], 'token_not_valid')
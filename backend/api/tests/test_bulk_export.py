@@ -0,0 +1,68 @@
+"""Dataset export shards hold every row, compacted vitals included, and only one export runs at a time."""
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from django.contrib import admin
+from django.core.management import CommandError, call_command
+from django.test import RequestFactory, TestCase, override_settings
+
+from api.bulk_export import exclusive_export, export_shard
+from api.filters import user_records
+from api.models import Goal, User, VitalDayBlock, VitalRecord
+from .seed import seed_user
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+class BulkExportTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(DATASET_EXPORT_ROOT=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.users = [seed_user('exported', 30), seed_user('exported2', 5)]
+
+    def test_export_shard(self):
+        import pyarrow.parquet as pq
+
+        shard, counts, _ = export_shard(3, [user.pk for user in self.users], self.directory, ['vitals', 'goals'],
+                                        'parquet')
+        self.assertEqual(shard, 3)
+        vitals = pq.read_table(os.path.join(self.directory, 'vitals', 'part-00003.parquet'))
+        goals = pq.read_table(os.path.join(self.directory, 'goals', 'part-00003.parquet'))
+
+        expected = sum(user_records(user, VitalRecord).count()
+                       + sum(user_records(user, VitalDayBlock).values_list('sample_count', flat=True))
+                       for user in self.users)
+        self.assertEqual(counts, {'vitals': expected, 'goals': goals.num_rows})
+        self.assertEqual(vitals.num_rows, expected)
+        self.assertEqual(goals.num_rows, sum(user_records(user, Goal).count() for user in self.users))
+        self.assertEqual(set(vitals.column('user_id').to_pylist()), {str(user.pk) for user in self.users})
+        self.assertEqual(vitals.schema.names[:2], ['user_id', 'timestamp'])
+
+    def test_one_export_at_a_time(self):
+        with exclusive_export():
+            with self.assertRaisesMessage(CommandError, 'Another dataset export is running'):
+                call_command('export_dataset', users='exported', output=self.directory)
+
+    def test_admin_action_refuses_while_an_export_runs(self):
+        model_admin = admin.site._registry[User]
+        request = RequestFactory().post('/admin/api/user/')
+        queryset = User.objects.filter(username='exported')
+        with mock.patch.object(model_admin, 'message_user'), mock.patch('api.admin.subprocess.Popen') as popen, \
+                mock.patch('api.admin.threading.Thread') as thread:
+            with exclusive_export():
+                model_admin.export_dataset(request, queryset)
+            popen.assert_not_called()
+
+            model_admin.export_dataset(request, queryset)
+            popen.assert_called_once()
+            # The child is reaped when it exits.
+            self.assertEqual(thread.call_args.kwargs['target'], popen.return_value.wait)
+            thread.return_value.start.assert_called_once()
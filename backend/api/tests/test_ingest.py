@@ -0,0 +1,81 @@
+"""Buffered vitals: orphaned segments are replayed exactly once, live workers' segments are left alone."""
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from api.filters import user_records
+from api.ingest import VitalIngestBuffer
+from api.models import VitalRecord
+
+READING = {'heart_rate': 70, 'blood_pressure_systolic': 118, 'blood_pressure_diastolic': 76,
+           'temperature': 98.4, 'oxygen_saturation': 98}
+
+
+class VitalIngestBufferTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.user = get_user_model().objects.create_user(username='ingester', password='x')
+
+    def _buffer(self):
+        buffer = VitalIngestBuffer(self.log_dir, batch_size=100, flush_interval=3600, fsync=False)
+        buffer.acquire()
+        self.addCleanup(buffer.release)
+        return buffer
+
+    def _live_buffer(self):
+        """A buffer accepting readings, without the flusher thread (flushes are driven by the test)."""
+        buffer = self._buffer()
+        with buffer._lock:
+            buffer._open_segment()
+        return buffer
+
+    def _readings(self):
+        return user_records(self.user, VitalRecord).count()
+
+    def test_dead_process_segments_are_replayed_once(self):
+        entries = [dict(READING, key=key, user=str(self.user.pk), timestamp='2030-01-01T08:00:00+00:00')
+                   for key in ('0f1e2d3c-4b5a-4697-8877-665544332211', '1a2b3c4d-5e6f-4a8b-9c0d-1e2f3a4b5c6d')]
+        lines = ''.join(json.dumps(entry) + '\n' for entry in entries) + '{"torn'
+        for segment in (1, 2):
+            # The same readings in two segments, as after an interrupted flush
+            with open(os.path.join(self.log_dir, f'ready-999-deadbeef-{segment:06d}.log'), 'w') as file:
+                file.write(lines)
+
+        buffer = self._buffer()
+        self.assertEqual(buffer.claim_orphans(), 2)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(self._readings(), 2)
+        self.assertEqual(os.listdir(self.log_dir), [f'{buffer.prefix}.lock'])
+
+    def test_live_worker_segments_are_not_claimed(self):
+        owner = self._live_buffer()
+        owner.append(self.user.pk, READING)
+        active = os.path.join(self.log_dir, f'active-{owner.prefix}-000001.log')
+        os.utime(active, (0, 0))  # however long the owner has been idle
+        other = self._buffer()
+        self.assertEqual(other.claim_orphans(), 0)
+
+        # The owner dies: the OS drops its lock and its readings are replayed.
+        owner._owner_lock.close()
+        owner._owner_lock = None
+        self.assertEqual(other.claim_orphans(), 1)
+        self.assertEqual(other.flush(), 1)
+        self.assertEqual(self._readings(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.log_dir, f'{owner.prefix}.lock')))
+
+    def test_stop_flushes_pending_readings(self):
+        buffer = self._live_buffer()
+        for _ in range(3):
+            buffer.append(self.user.pk, READING)
+        buffer.stop()
+        self.assertEqual(self._readings(), 3)
+        self.assertEqual(os.listdir(self.log_dir), [])
+        with self.assertRaises(RuntimeError):
+            buffer.append(self.user.pk, READING)
@@ -0,0 +1,79 @@
+"""PDF export reports render from the twin state and reuse cached charts until the data changes."""
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import pdf_reports
+from api.models import ExportRequest, LifestyleRecord
+from api.sharding import shard_for_user
+from .seed import seed_user
+
+
+class PdfReportTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(MEDIA_ROOT=os.path.join(directory, 'media'),
+                                     REPORT_CHART_CACHE_DIR=os.path.join(directory, 'charts'))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = seed_user('reporter', 25)
+        self.alias = shard_for_user(self.user.pk)
+
+    def _render(self):
+        request = ExportRequest.objects.using(self.alias).create(user=self.user, format='pdf')
+        claimed = pdf_reports.claim_pending(limit=10)
+        self.assertEqual([claim.pk for claim in claimed], [request.pk])
+        job, = pdf_reports.prepare_jobs(claimed)
+        export_id, seconds, charts, cached = pdf_reports.render_report(job)
+        pdf_reports.mark_completed(claimed[0], seconds)
+        request.refresh_from_db()
+        return request, job, charts, cached
+
+    def test_report_is_rendered_and_charts_are_reused(self):
+        request, job, charts, cached = self._render()
+        self.assertEqual((charts, cached), (len(pdf_reports.METRICS), 0))
+        self.assertEqual(request.status, 'completed')
+        self.assertIsNotNone(request.render_seconds)
+        self.assertTrue(request.file_url.endswith(f'/pdf/report-{request.pk}.pdf'))
+        with open(job['output_path'], 'rb') as file:
+            self.assertEqual(file.read(5), b'%PDF-')
+
+        request, _, charts, cached = self._render()
+        self.assertEqual(cached, charts)
+
+    def test_new_records_invalidate_cached_charts(self):
+        self._render()
+        LifestyleRecord.objects.using(self.alias).create(user=self.user, timestamp=timezone.now(), sleep_hours=8,
+                                                         stress_level=3, diet_quality_score=6)
+        _, job, charts, cached = self._render()
+        self.assertEqual(cached, 0)
+        # Only the current version of each chart is kept.
+        self.assertEqual(len(os.listdir(os.path.join(job['cache_dir'], job['user_id']))), charts)
+
+    def test_abandoned_claims_are_queued_again(self):
+        request = ExportRequest.objects.using(self.alias).create(user=self.user, format='pdf')
+        abandoned, = pdf_reports.claim_pending(limit=10)
+        self.assertEqual(pdf_reports.requeue_stale(3600), 0)
+
+        # The run that claimed it died an hour ago.
+        ExportRequest.objects.using(self.alias).filter(pk=request.pk).update(
+            claimed_at=abandoned.claimed_at - timedelta(hours=1))
+        self.assertEqual(pdf_reports.requeue_stale(3600), 1)
+        request.refresh_from_db()
+        self.assertEqual((request.status, request.claimed_at), ('pending', None))
+
+        claim, = pdf_reports.claim_pending(limit=10)
+        # A late result from the abandoned claim does not count.
+        pdf_reports.mark_completed(abandoned, 1.0)
+        request.refresh_from_db()
+        self.assertEqual(request.status, 'processing')
+        pdf_reports.mark_completed(claim, 1.0)
+        request.refresh_from_db()
+        self.assertEqual(request.status, 'completed')
@@ -0,0 +1,52 @@
+"""Bulk provisioning: names are unique ignoring case, and the endpoint never forks a process pool."""
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.provisioning import MAX_API_ROWS, POOL_MIN_ROWS, provision, validate_rows
+
+FAST_HASHER = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def _row(username, email, password=''):
+    return {'username': username, 'email': email, 'password': password, 'first_name': '', 'last_name': ''}
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHER)
+class ProvisioningTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        get_user_model().objects.create_user(username='bob', email='bob@example.com', password='x')
+
+    def test_taken_names_ignore_case(self):
+        results = validate_rows([_row('BOB', 'robert@example.com'), _row('robert', 'Bob@Example.com'),
+                                 _row('carol', 'carol@example.com')])
+        self.assertEqual(results[0]['errors'], {'username': ['A user with that username already exists.']})
+        self.assertEqual(results[1]['errors'], {'email': ['A user with that email already exists.']})
+        self.assertNotIn('errors', results[2])
+
+    def test_duplicates_within_the_file_ignore_case(self):
+        results = provision([_row('dave', 'dave@example.com'), _row('Dave', 'DAVE@example.com')])
+        self.assertEqual(results[0]['status'], 'created')
+        self.assertEqual(results[1]['errors'], {'username': ['Duplicate of row 2.'], 'email': ['Duplicate of row 2.']})
+        self.assertEqual(get_user_model().objects.filter(username__iexact='dave').count(), 1)
+
+    def test_endpoint_hashes_in_process(self):
+        admin = get_user_model().objects.create_user(username='admin', password='x', is_staff=True)
+        client = APIClient(HTTP_HOST='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(admin).access_token}')
+        self.assertGreaterEqual(MAX_API_ROWS, POOL_MIN_ROWS)
+        students = ''.join(f'student{index},student{index}@example.com,\n' for index in range(MAX_API_ROWS))
+        upload = SimpleUploadedFile('students.csv', f'username,email,password\n{students}'.encode())
+
+        with mock.patch('api.provisioning.ProcessPoolExecutor') as pool:
+            response = client.post(reverse('bulk-provision'), {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['created'], MAX_API_ROWS)
+        pool.assert_not_called()
@@ -0,0 +1,198 @@
+"""
+Exact query budgets for every API route, checked at several data sizes.
+
+A budget is the number of SQL statements a request may run, summed over
+all databases and excluding savepoint bookkeeping. It must not depend on
+how much data the user has or on the page size; if a change legitimately
+adds a query, update the budget here in the same commit.
+"""
+from contextlib import contextmanager
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import urls as api_urls
+from api.filters import user_records
+from api.models import VitalRecord, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest
+from api.token_blacklist import revocations
+from .seed import PASSWORD, seed_user
+
+SIZES = (1, 25, 120)
+BOOKKEEPING = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+VITAL = {'heart_rate': 72, 'blood_pressure_systolic': 120, 'blood_pressure_diastolic': 80,
+         'temperature': 98.6, 'oxygen_saturation': 98}
+LIFESTYLE = {'sleep_hours': 7.5, 'stress_level': 4, 'diet_quality_score': 7}
+ACADEMIC = {'study_hours': 3, 'attendance_percentage': 92, 'focus_level': 7, 'assignment_completion_rate': 85}
+GOAL = {'title': 'Sleep more', 'target_value': 8, 'current_value': 6, 'unit': 'hours', 'deadline': '2030-01-01'}
+
+
+@contextmanager
+def count_queries():
+    """Capture the statements run on every database, minus savepoints."""
+    contexts = [CaptureQueriesContext(connection) for connection in connections.all()]
+    for context in contexts:
+        context.__enter__()
+    queries = []
+    try:
+        yield queries
+    finally:
+        for context in contexts:
+            context.__exit__(None, None, None)
+            queries.extend(query['sql'] for query in context.captured_queries
+                           if not query['sql'].startswith(BOOKKEEPING))
+
+
+def _first(user, model):
+    return user_records(user, model).order_by('pk').first().pk
+
+
+# (url name, method, model of the detail object or query string, request body, budget)
+# String bodies are filled in per user by QueryBudgetTests.request().
+# Authenticated routes spend 1 query loading the user from the token.
+# Updating or deleting a record rebuilds the twin state from the tables
+# (see api/twin.py), which is why those cost more than inserts.
+ROUTES = [
+    ('api-root', 'get', None, None, 1),
+    ('ping', 'get', None, None, 0),
+    ('signup', 'post', None, 'signup', 3),
+    ('login', 'post', None, 'username', 1),
+    ('login', 'post', None, 'email', 1),
+    ('token_refresh', 'post', None, 'refresh', 1),
+    # Taken usernames, taken emails, then one INSERT for the whole chunk
+    ('bulk-provision', 'post', None, 'students', 4),
+    ('profile', 'get', None, None, 1),
+    ('profile-update', 'patch', None, {'first_name': 'Ada'}, 2),
+    # One aggregate per kind of record, plus the vital day blocks
+    ('analytics-summary', 'get', None, None, 6),
+    ('twin-state', 'get', None, None, 2),
+    # Fits the response model: daily lifestyle, academic and vitals aggregates plus vital day blocks
+    ('simulate', 'post', None, {'changes': {'sleep_hours': [0, 1], 'study_hours': [-1, 0, 1]}}, 6),
+
+    ('vital-list', 'get', None, None, 4),
+    ('vital-list', 'get', '?last=7d&fields=heart_rate,timestamp', None, 4),
+    ('vital-list', 'post', None, VITAL, 4),
+    ('vital-latest', 'get', None, None, 2),
+    ('vital-detail', 'get', VitalRecord, None, 2),
+    ('vital-detail', 'patch', VitalRecord, {'heart_rate': 80}, 18),
+    ('vital-detail', 'delete', VitalRecord, None, 18),
+
+    ('lifestyle-list', 'get', None, None, 3),
+    ('lifestyle-list', 'get', '?start_date=2000-01-01&fields=sleep_hours', None, 3),
+    ('lifestyle-list', 'post', None, LIFESTYLE, 4),
+    ('lifestyle-detail', 'get', LifestyleRecord, None, 2),
+    ('lifestyle-detail', 'put', LifestyleRecord, LIFESTYLE, 18),
+    ('lifestyle-detail', 'delete', LifestyleRecord, None, 18),
+
+    ('academic-list', 'get', None, None, 3),
+    ('academic-list', 'post', None, ACADEMIC, 4),
+    ('academic-detail', 'get', AcademicMetric, None, 2),
+    ('academic-detail', 'patch', AcademicMetric, {'focus_level': 9}, 18),
+    ('academic-detail', 'delete', AcademicMetric, None, 18),
+
+    ('goal-list', 'get', None, None, 3),
+    ('goal-list', 'get', '?completed=false', None, 3),
+    ('goal-list', 'post', None, GOAL, 6),
+    ('goal-active', 'get', None, None, 2),
+    ('goal-detail', 'get', Goal, None, 2),
+    ('goal-detail', 'patch', Goal, {'current_value': 7}, 7),
+    ('goal-detail', 'delete', Goal, None, 7),
+
+    ('achievement-list', 'get', None, None, 3),
+    ('achievement-detail', 'get', AchievementBadge, None, 2),
+
+    ('export-list', 'get', None, None, 3),
+    ('export-list', 'post', None, {'format': 'json'}, 3),
+    # Only queued: the render_reports command renders PDF reports out of process
+    ('export-list', 'post', None, {'format': 'pdf'}, 2),
+    ('export-detail', 'get', ExportRequest, None, 2),
+
+    # Same work as the sync views (reads run one at a time here, see the class settings)
+    ('async-analytics-summary', 'get', None, None, 6),
+    ('async-vital-latest', 'get', None, None, 2),
+    ('async-goal-list', 'get', None, None, 3),
+    ('async-goal-list', 'get', '?completed=false', None, 3),
+    ('async-achievement-list', 'get', None, None, 3),
+]
+
+
+def _route_names(patterns):
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= _route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+# Async reads stay on the test's connection: other threads' connections cannot see its transaction.
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+                   TOKEN_BLACKLIST_SYNC_SECONDS=3600, ASYNC_READS_IN_PARALLEL=False)
+class QueryBudgetTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {size: seed_user(f'perf{size}', size) for size in SIZES}
+        get_user_model().objects.filter(username__startswith='perf').update(is_staff=True)
+
+    def setUp(self):
+        # Budgets are for the steady state, between two blacklist syncs.
+        revocations.sync(force=True)
+
+    def request(self, user, name, method, target, body):
+        client = APIClient(HTTP_HOST='localhost')
+        if name not in ('signup', 'login', 'token_refresh', 'ping'):
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        if isinstance(target, type):
+            url = reverse(name, args=[_first(user, target)])
+        else:
+            url = reverse(name) + (target or '')
+        if body == 'signup':
+            body = {'username': f'new{user.username}', 'email': f'new{user.username}@example.com',
+                    'password': PASSWORD, 'password_confirm': PASSWORD}
+        elif body == 'refresh':
+            body = {'refresh': str(RefreshToken.for_user(user))}
+        elif body in ('username', 'email'):
+            body = {body: getattr(user, body), 'password': PASSWORD}
+        elif body == 'students':
+            students = ''.join(f'{user.username}-s{index},{user.username}-s{index}@example.com,\n' for index in range(20))
+            body = {'file': SimpleUploadedFile('students.csv', f'username,email,password\n{students}'.encode()),
+                    'issue_tokens': True}
+        with count_queries() as queries:
+            response = getattr(client, method)(url, body, format='multipart' if body and 'file' in body else 'json')
+        self.assertLess(response.status_code, 300, f'{method.upper()} {url}: {response.content[:300]}')
+        return queries
+
+    def test_every_route_has_a_budget(self):
+        missing = _route_names(api_urls.urlpatterns) - {route[0] for route in ROUTES}
+        self.assertFalse(missing, f'Routes without a query budget: {sorted(missing)}')
+
+    def test_query_budgets(self):
+        for name, method, target, body, budget in ROUTES:
+            for size, user in self.users.items():
+                with self.subTest(route=name, method=method, target=target, size=size):
+                    queries = self.request(user, name, method, target, body)
+                    self.assertEqual(len(queries), budget, '\n'.join(queries))
+
+    def test_queries_do_not_grow_with_page_size(self):
+        user = self.users[max(SIZES)]
+        for name in ('vital-list', 'lifestyle-list', 'academic-list', 'goal-list', 'achievement-list'):
+            counts = {}
+            for page_size in (5, 50, 500, 1000):
+                with mock.patch.object(PageNumberPagination, 'page_size', page_size):
+                    counts[page_size] = len(self.request(user, name, 'get', None, None))
+            with self.subTest(route=name):
+                self.assertEqual(counts[5], counts[50], counts)
+                self.assertEqual(counts[500], counts[1000], counts)
+                # Pages reaching into compacted vitals fetch all their day blocks in one extra query.
+                self.assertEqual(counts[500] - counts[5], 1 if name == 'vital-list' else 0, counts)
@@ -0,0 +1,105 @@
+"""
+EXPLAIN checks for the record list/range, latest and analytics queries,
+and for the login lookup.
+
+The statements a request actually runs are captured and explained on the
+same database. A plan fails if it scans a whole table or sorts record
+rows instead of reading them in index order. On PostgreSQL sequential
+scans and sorts are disabled for the EXPLAIN, so with small test tables
+the planner still picks an index whenever one is usable.
+"""
+import re
+from contextlib import ExitStack
+
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .seed import PASSWORD, seed_user
+
+# Tables read per user; the timestamped ones must also come back in index order.
+USER_TABLES = ('vital_records', 'vital_day_blocks', 'lifestyle_records', 'academic_metrics', 'goals')
+TIMESTAMPED_TABLES = ('vital_records', 'lifestyle_records', 'academic_metrics')
+EXPLAINED_ROUTES = [
+    ('vital-list', ''),
+    ('vital-list', '?last=7d'),
+    ('vital-list', '?start_date=2000-01-01&end_date=2100-01-01&fields=heart_rate,timestamp'),
+    ('vital-latest', ''),
+    ('lifestyle-list', '?last=2w'),
+    ('academic-list', '?start_date=2000-01-01'),
+    ('goal-list', '?completed=false'),
+    ('analytics-summary', '?days=7'),
+]
+
+
+def explain(connection, sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        cursor.execute('SET LOCAL enable_sort = off')
+        cursor.execute(f'EXPLAIN {sql}')
+        return '\n'.join(row[0] for row in cursor.fetchall())
+
+
+def plan_problems(vendor, plan, ordered, tables=USER_TABLES):
+    """Return the lines of ``plan`` that read ``tables`` without an index."""
+    tables = '|'.join(tables)
+    if vendor == 'sqlite':
+        problems = [rf'\bSCAN ({tables})\b']
+        if ordered:
+            problems.append(r'USE TEMP B-TREE FOR (RIGHT PART OF )?ORDER BY')
+    else:
+        problems = [rf'Seq Scan on ({tables})\b']
+        if ordered:
+            problems.append(r'Sort Key: .*\btimestamp\b')
+    pattern = re.compile('|'.join(problems))
+    return [line for line in plan.splitlines() if pattern.search(line)]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryPlanTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        # A second user so that filtering by user actually has to discriminate.
+        seed_user('neighbour', 50)
+        cls.user = seed_user('planner', 200)
+
+    def setUp(self):
+        vendor = connections['default'].vendor
+        if vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f'No plan checks for {vendor}')
+
+    def test_record_queries_use_indexes(self):
+        client = APIClient(HTTP_HOST='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        for name, query in EXPLAINED_ROUTES:
+            with ExitStack() as stack:
+                captures = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+                response = client.get(reverse(name) + query)
+            self.assertEqual(response.status_code, 200, response.content[:300])
+            for capture in captures:
+                for sql in (captured['sql'] for captured in capture.captured_queries):
+                    if not sql.startswith('SELECT') or not any(f'"{table}"' in sql for table in USER_TABLES):
+                        continue
+                    ordered = any(f'FROM "{table}"' in sql for table in TIMESTAMPED_TABLES)
+                    plan = explain(capture.connection, sql)
+                    with self.subTest(route=name, query=query, sql=sql[:120]):
+                        self.assertFalse(plan_problems(capture.connection.vendor, plan, ordered), f'{sql}\n\n{plan}')
+
+    def test_login_uses_lower_indexes(self):
+        client = APIClient(HTTP_HOST='localhost')
+        for body in ({'username': 'PLANNER'}, {'email': 'Planner@Example.com'}):
+            with CaptureQueriesContext(connections['default']) as capture:
+                response = client.post(reverse('login'), {**body, 'password': PASSWORD}, format='json')
+            self.assertEqual(response.status_code, 200, response.content[:300])
+            sql = capture.captured_queries[0]['sql']
+            plan = explain(capture.connection, sql)
+            with self.subTest(body=body):
+                self.assertFalse(plan_problems(capture.connection.vendor, plan, False, ('users',)), f'{sql}\n\n{plan}')
@@ -0,0 +1,85 @@
+"""Time range parameters are validated (400, never 500) and fields= limits both columns and payload."""
+from datetime import datetime, timedelta
+
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.filters import parse_time_range
+from api.sharding import shard_for_user
+from .seed import seed_user
+
+
+class ParseTimeRangeTests(SimpleTestCase):
+    def test_relative_windows(self):
+        for last, delta in [('30m', timedelta(minutes=30)), ('12h', timedelta(hours=12)),
+                            ('7d', timedelta(days=7)), (' 2w ', timedelta(weeks=2))]:
+            with self.subTest(last):
+                before = timezone.now()
+                start, end = parse_time_range({'last': last})
+                self.assertIsNone(end)
+                self.assertLessEqual(abs(before - delta - start), timedelta(seconds=1))
+
+    def test_dates_cover_whole_days(self):
+        start, end = parse_time_range({'start_date': '2030-01-02', 'end_date': '2030-01-03'})
+        self.assertEqual(start, timezone.make_aware(datetime(2030, 1, 2)))
+        self.assertEqual(end, timezone.make_aware(datetime(2030, 1, 3, 23, 59, 59, 999999)))
+        start, _ = parse_time_range({'start_date': '2030-01-02T10:30:00+02:00'})
+        self.assertEqual(start.utcoffset(), timedelta(hours=2))
+
+    def test_invalid_ranges(self):
+        cases = {
+            'last': [{'last': '7'}, {'last': 'd7'}, {'last': '-1d'}, {'last': '7y'},
+                     {'last': '99999999999d'}, {'last': '9999999w'}, {'last': '7d', 'start_date': '2030-01-01'}],
+            'start_date': [{'start_date': 'yesterday'}, {'start_date': '2030-02-30'}],
+            'end_date': [{'end_date': '2030-13-01'}, {'start_date': '2030-01-02', 'end_date': '2030-01-01'}],
+        }
+        for name, params_list in cases.items():
+            for params in params_list:
+                with self.subTest(params):
+                    with self.assertRaises(ValidationError) as raised:
+                        parse_time_range(params)
+                    self.assertIn(name, raised.exception.detail)
+
+
+class RecordQueryTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = seed_user('querier', 20)
+        self.client = APIClient(HTTP_HOST='localhost')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_oversized_windows_are_rejected(self):
+        for last in ('99999999999d', '9999999w'):
+            with self.subTest(last):
+                response = self.client.get(reverse('vital-list'), {'last': last})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('last', response.json())
+
+    def test_fields_projection(self):
+        with CaptureQueriesContext(connections[shard_for_user(self.user.pk)]) as queries:
+            response = self.client.get(reverse('lifestyle-list'), {'fields': 'sleep_hours,timestamp'})
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()['results']
+        self.assertTrue(rows)
+        self.assertTrue(all(set(row) == {'sleep_hours', 'timestamp'} for row in rows))
+        select = next(query['sql'] for query in queries.captured_queries
+                      if query['sql'].startswith('SELECT') and 'sleep_hours' in query['sql'])
+        self.assertNotIn('stress_level', select)
+
+    def test_vital_fields_projection(self):
+        response = self.client.get(reverse('vital-list'), {'fields': 'heart_rate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), response.json()['count'])
+        self.assertTrue(all(set(row) == {'heart_rate'} for row in response.json()['results']))
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('vital-list'), {'fields': 'heart_rate,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
@@ -0,0 +1,75 @@
+"""Safe requests read from a replica unless the client wrote within REPLICA_STICKY_SECONDS."""
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.db_routers import PIN_COOKIE, PrimaryReplicaRouter
+from api.middleware import ReplicaRoutingMiddleware
+from api.models import Goal, RevokedToken
+
+router = PrimaryReplicaRouter()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], REPLICA_STICKY_SECONDS=15)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        user = get_user_model()(pk='5b7c3d0e-8f43-4c55-9a3e-2a1f0b9d6c11', username='reader')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+
+    def _send(self, method, cookies=None, status=200, **extra):
+        """Run a request through the middleware; returns (database Goal reads went to, response)."""
+        seen = []
+
+        def view(request):
+            seen.append(router.db_for_read(Goal))
+            return HttpResponse(status=status)
+
+        request = getattr(self.factory, method)('/api/goals/', **self.auth, **extra)
+        request.COOKIES.update(cookies or {})
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_router(self):
+        self.assertEqual(router.db_for_read(Goal), 'default')
+        self.assertEqual(router.db_for_write(Goal), 'default')
+        self.assertFalse(router.allow_migrate('replica_1', 'api'))
+        self.assertTrue(router.allow_migrate('default', 'api'))
+
+    def test_safe_reads_go_to_the_replica(self):
+        self.assertEqual(self._send('get')[0], 'replica_1')
+        self.assertEqual(self._send('post')[0], 'default')
+
+    def test_primary_only_models_stay_on_the_primary(self):
+        seen = []
+
+        def view(request):
+            seen.extend([router.db_for_read(get_user_model()), router.db_for_read(RevokedToken)])
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(self.factory.get('/api/goals/', **self.auth))
+        self.assertEqual(seen, ['default', 'default'])
+
+    def test_write_pins_the_client_to_the_primary(self):
+        _, response = self._send('post')
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 15)
+        # The pin is carried by the client, so any worker process honours it.
+        self.assertEqual(self._send('get', cookies={PIN_COOKIE: cookie.value})[0], 'default')
+        self.assertEqual(self._send('get')[0], 'replica_1')
+
+    def test_failed_writes_and_anonymous_requests_do_not_pin(self):
+        _, response = self._send('post', status=400)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.auth = {}
+        _, response = self._send('post')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_is_signed_and_bound_to_the_user(self):
+        _, response = self._send('post')
+        value = response.cookies[PIN_COOKIE].value
+        self.assertEqual(self._send('get', cookies={PIN_COOKIE: value + 'x'})[0], 'replica_1')
+        other = get_user_model()(pk='0d3f4a9e-1c2b-4e5f-8a7b-6c5d4e3f2a1b', username='other')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(other)}'}
+        self.assertEqual(self._send('get', cookies={PIN_COOKIE: value})[0], 'replica_1')
@@ -0,0 +1,85 @@
+"""
+Per-user rows live on the user's shard, follow the user when moved and go
+when the user is deleted. Needs two or more shards, e.g.
+SHARD_DATABASE_URLS=sqlite:////tmp/shard1.db,sqlite:////tmp/shard2.db
+"""
+import unittest
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from api import db_routers, sharding
+from api.models import Goal, UserShard
+from .seed import seed_user
+
+DUMMY_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def rows_by_shard(user_id):
+    """{alias: {model label: rows}} for every shard holding rows of ``user_id``."""
+    found = {}
+    for alias in settings.SHARD_DATABASES:
+        for model in sharding.sharded_models():
+            count = model._base_manager.using(alias).filter(user_id=user_id).count()
+            if count:
+                found.setdefault(alias, {})[model._meta.label] = count
+    return found
+
+
+@unittest.skipUnless(len(settings.SHARD_DATABASES) > 1, 'set SHARD_DATABASE_URLS to test sharding')
+class ShardingTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = seed_user('sharded', 10)
+        self.alias = sharding.shard_for_user(self.user.pk)
+
+    def test_rows_are_routed_to_the_users_shard(self):
+        self.assertEqual(self.alias, sharding.get_ring().get(self.user.pk))
+        self.assertEqual(UserShard.objects.get(user=self.user).alias, self.alias)
+        self.assertEqual(list(rows_by_shard(self.user.pk)), [self.alias])
+
+        goal = self.user.goals.create(title='Read', target_value=5, unit='books', deadline='2030-01-01')
+        self.assertEqual(goal._state.db, self.alias)
+        token = db_routers.set_current_user_id(self.user.pk)
+        try:
+            # Without an instance hint, the request's user picks the shard.
+            self.assertEqual(Goal.objects.filter(title='Read').get().pk, goal.pk)
+        finally:
+            db_routers.reset_current_user_id(token)
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_move_user(self):
+        before = rows_by_shard(self.user.pk)[self.alias]
+        target = next(alias for alias in settings.SHARD_DATABASES if alias != self.alias)
+        copied = sharding.move_user(self.user.pk, target)
+
+        self.assertEqual({label: rows for label, rows in copied.items() if rows}, before)
+        self.assertEqual(rows_by_shard(self.user.pk), {target: before})
+        self.assertEqual(sharding.shard_for_user(self.user.pk), target)
+        self.assertEqual(self.user.goals.count(), before['api.Goal'])
+
+    def test_moves_need_a_shared_cache(self):
+        target = next(alias for alias in settings.SHARD_DATABASES if alias != self.alias)
+        with self.assertRaises(ImproperlyConfigured):
+            sharding.move_user(self.user.pk, target)
+        with self.assertRaisesMessage(CommandError, 'shared by all workers'):
+            call_command('rebalance_shards', user='sharded', to=target)
+        self.assertEqual(list(rows_by_shard(self.user.pk)), [self.alias])
+
+    def test_deleting_a_user_deletes_rows_on_every_shard(self):
+        user_id = self.user.pk
+        self.user.delete()
+        self.assertEqual(rows_by_shard(user_id), {})
+        self.assertFalse(UserShard.objects.filter(user_id=user_id).exists())
+
+    def test_deleting_a_user_on_another_shard(self):
+        # The user row stays on 'default' while their rows are elsewhere.
+        users = [seed_user(f'spread{index}', 2) for index in range(8)]
+        elsewhere = next(user for user in users if sharding.shard_for_user(user.pk) != 'default')
+        user_id = elsewhere.pk
+        get_user_model().objects.filter(pk=user_id).delete()
+        self.assertEqual(rows_by_shard(user_id), {})
@@ -0,0 +1,115 @@
+"""What-if simulation: scenario grids, clipping to the model validators, model caching and request validation."""
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import simulation
+from api.models import LifestyleRecord
+from api.sharding import shard_for_user
+from .seed import seed_user
+
+SLEEP, STUDY = list(simulation.INPUTS).index('sleep_hours'), list(simulation.INPUTS).index('study_hours')
+FOCUS = list(simulation.OUTPUTS).index('focus_level')
+
+
+class ScenarioGridTests(SimpleTestCase):
+    baseline = np.array([7.0, 30.0, 8.0, 5.0, 3.0])
+
+    def test_cartesian_product_in_order(self):
+        grid = simulation.scenario_grid(self.baseline, {'sleep_hours': [0, 1], 'study_hours': [-1, 0, 1]})
+        self.assertEqual(grid.shape, (6, len(simulation.INPUTS)))
+        # The first lever varies slowest.
+        self.assertEqual(grid[:, [SLEEP, STUDY]].tolist(), [[7, 2], [7, 3], [7, 4], [8, 2], [8, 3], [8, 4]])
+        np.testing.assert_array_equal(np.delete(grid, [SLEEP, STUDY], axis=1),
+                                      np.tile(np.delete(self.baseline, [SLEEP, STUDY]), (6, 1)))
+
+    def test_no_changes_is_the_baseline(self):
+        np.testing.assert_array_equal(simulation.scenario_grid(self.baseline, {}), [self.baseline])
+
+    def test_inputs_are_clipped_to_the_validators(self):
+        grid = simulation.scenario_grid(self.baseline, {'sleep_hours': [-30, 30], 'study_hours': [-10]})
+        self.assertEqual(grid[:, SLEEP].tolist(), [0.0, 24.0])
+        self.assertEqual(grid[:, STUDY].tolist(), [0.0, 0.0])
+
+    def test_outputs_are_clipped_to_the_validators(self):
+        rng = np.random.default_rng(3)
+        X = np.column_stack([rng.uniform(4, 10, 60), rng.uniform(0, 90, 60), rng.uniform(2, 12, 60),
+                             rng.uniform(1, 10, 60), rng.uniform(0, 8, 60)])
+        Y = np.column_stack([5 + 3 * (X[:, SLEEP] - 7), rng.uniform(40, 100, 60), rng.uniform(1, 10, 60),
+                             rng.uniform(55, 110, 60)])
+        model = simulation.ResponseModel(X, Y)
+        grid = simulation.scenario_grid(X.mean(axis=0), {'sleep_hours': [-24, 0, 24]})
+        predicted = model.predict(grid)
+        self.assertEqual((predicted[0, FOCUS], predicted[2, FOCUS]), (1, 10))
+        self.assertTrue(np.all(predicted >= simulation.OUTPUT_BOUNDS[0]))
+        self.assertTrue(np.all(predicted <= simulation.OUTPUT_BOUNDS[1]))
+
+
+class SimulationApiTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = seed_user('simulator', 60)
+        self.client = self._client(self.user)
+
+    def _client(self, user):
+        client = APIClient(HTTP_HOST='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def simulate(self, body, client=None):
+        return (client or self.client).post(reverse('simulate'), body, format='json')
+
+    def test_scenarios(self):
+        response = self.simulate({'changes': {'sleep_hours': [0, 1], 'study_hours': [-1, 0, 1]},
+                                  'maximize': 'focus_level'})
+        self.assertEqual(response.status_code, 200, response.content[:300])
+        body = response.json()
+        self.assertEqual(body['scenarios']['count'], 6)
+        sleep = body['baseline']['inputs']['sleep_hours']
+        self.assertEqual(body['scenarios']['inputs']['sleep_hours'], [sleep] * 3 + [round(sleep + 1, 2)] * 3)
+        focus = body['scenarios']['outputs']['focus_level']
+        self.assertEqual(len(focus), 6)
+        self.assertTrue(all(1 <= value <= 10 for value in focus))
+        self.assertEqual(body['best']['outputs']['focus_level'], max(focus))
+
+    def test_invalid_requests(self):
+        cases = {
+            'too many scenarios': ({'sleep_hours': list(range(200)), 'study_hours': list(range(101))}, {}, 'changes'),
+            'unknown lever': ({'coffee_cups': [1]}, {}, 'changes'),
+            'nan': ({'sleep_hours': ['nan']}, {}, 'changes'),
+            'inf': ({'sleep_hours': [0, 'inf']}, {}, 'changes'),
+            '-inf': ({'study_hours': ['-inf']}, {}, 'changes'),
+            'both objectives': ({'sleep_hours': [1]}, {'maximize': 'focus_level', 'minimize': 'stress_level'},
+                                'minimize'),
+            'unknown objective': ({'sleep_hours': [1]}, {'maximize': 'happiness'}, 'maximize'),
+        }
+        for name, (changes, extra, field) in cases.items():
+            with self.subTest(name):
+                response = self.simulate({'changes': changes, **extra})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json())
+
+    def test_no_overlapping_days(self):
+        user = get_user_model().objects.create_user(username='sleeper', email='sleeper@example.com', password='x')
+        LifestyleRecord.objects.using(shard_for_user(user.pk)).create(
+            user=user, timestamp=timezone.now(), sleep_hours=8, stress_level=3, diet_quality_score=6)
+        response = self.simulate({'changes': {'sleep_hours': [1]}}, self._client(user))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('same days', response.json()['error'])
+
+    def test_model_is_cached_until_the_twin_changes(self):
+        alias = shard_for_user(self.user.pk)
+        with mock.patch('api.simulation.daily_history', wraps=simulation.daily_history) as history:
+            first = simulation.get_model(self.user.pk, alias, 7)
+            self.assertIs(type(simulation.get_model(self.user.pk, alias, 7)), simulation.ResponseModel)
+            self.assertEqual(history.call_count, 1)
+            simulation.get_model(self.user.pk, alias, 8)
+            self.assertEqual(history.call_count, 2)
+        self.assertEqual(first.days, simulation.get_model(self.user.pk, alias, 7).days)
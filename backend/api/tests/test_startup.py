@@ -0,0 +1,38 @@
+"""The prebuilt schema file is served as is, and the worker warm-up runs."""
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api import schema
+from api.warmup import warm_up
+
+
+class StartupTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        schema._static_schema = None
+        self.addCleanup(setattr, schema, '_static_schema', None)
+
+    def test_built_schema_is_served_without_generating(self):
+        with tempfile.NamedTemporaryFile(suffix='.yml', delete=False) as file:
+            file.write(b'openapi: 3.0.3\n')
+        self.addCleanup(os.remove, file.name)
+        with override_settings(OPENAPI_SCHEMA_FILE=file.name):
+            response = self.client.get(reverse('schema'), HTTP_HOST='localhost')
+            self.assertEqual(response.content, b'openapi: 3.0.3\n')
+            self.assertEqual(response['Content-Type'], schema.SCHEMA_CONTENT_TYPE)
+            generated = self.client.get(reverse('schema') + '?format=json', HTTP_HOST='localhost')
+            self.assertIn('/api/auth/login/', generated.json()['paths'])
+
+    def test_schema_is_generated_without_a_built_file(self):
+        with override_settings(OPENAPI_SCHEMA_FILE=os.path.join(tempfile.gettempdir(), 'missing-schema.yml')):
+            response = self.client.get(reverse('schema'), HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'/api/auth/login/', response.content)
+
+    def test_warm_up(self):
+        self.assertEqual(set(warm_up()), {'load', 'connect', 'total'})
+        self.assertEqual(set(warm_up(include_connect=False)), {'load', 'total'})
@@ -0,0 +1,75 @@
+"""Refresh token blacklist: Bloom filters never miss a revoked JTI, and a rotated refresh token works once."""
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.token_blacklist import BUCKET_SECONDS, BloomFilter, RevocationFilter, is_revoked, revoke
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        keys = [uuid.uuid4().hex for _ in range(2000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        # At capacity the false positive rate stays near the target.
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RevocationFilterTests(TestCase):
+    databases = '__all__'
+
+    def test_full_buckets_grow_without_losing_entries(self):
+        revocations = RevocationFilter()
+        revocations.sync(force=True)
+        exp = time.time() + BUCKET_SECONDS
+        keys = [uuid.uuid4().hex for _ in range(25000)]
+        for key in keys:
+            revocations.add(key, exp)
+        self.assertEqual(len(revocations._buckets[int(exp) // BUCKET_SECONDS]), 2)
+        self.assertTrue(all(revocations.might_contain(key, exp) for key in keys))
+
+    def test_adds_during_a_sync(self):
+        revocations = RevocationFilter()
+        exp = time.time() + BUCKET_SECONDS
+        keys = [[uuid.uuid4().hex for _ in range(500)] for _ in range(4)]
+        threads = [threading.Thread(target=lambda chunk=chunk: [revocations.add(key, exp) for key in chunk])
+                   for chunk in keys]
+        for thread in threads:
+            thread.start()
+        revocations.sync(force=True)
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(revocations.might_contain(key, exp) for chunk in keys for key in chunk))
+
+    def test_revoke_once(self):
+        jti, exp = uuid.uuid4().hex, time.time() + BUCKET_SECONDS
+        self.assertFalse(is_revoked(jti, exp))
+        self.assertTrue(revoke(jti, exp))
+        self.assertFalse(revoke(jti, exp))
+        self.assertTrue(is_revoked(jti, exp))
+
+
+class TokenRefreshTests(TestCase):
+    databases = '__all__'
+
+    def test_rotated_refresh_token_is_rejected_when_reused(self):
+        user = get_user_model().objects.create_user(username='refresher', password='x')
+        client = APIClient(HTTP_HOST='localhost')
+        refresh = str(RefreshToken.for_user(user))
+
+        response = client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        rotated = response.json()['refresh']
+        self.assertNotEqual(rotated, refresh)
+
+        self.assertEqual(client.post(reverse('token_refresh'), {'refresh': refresh}, format='json').status_code, 401)
+        self.assertEqual(client.post(reverse('token_refresh'), {'refresh': rotated}, format='json').status_code, 200)
@@ -0,0 +1,101 @@
+"""Day block encoding round-trips exactly, and listings merge raw rows and block samples by time."""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+from api.filters import user_records
+from api.models import VitalDayBlock, VitalRecord
+from api.sharding import shard_for_user
+from api.vital_blocks import VitalRecordSeries, decode, encode, latest_record, to_epoch_ms
+from .seed import seed_user
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _arrays(timestamps, heart_rate, systolic, diastolic, temperature, oxygen):
+    return {
+        'timestamp': np.array(timestamps, dtype=np.int64), 'heart_rate': np.array(heart_rate),
+        'blood_pressure_systolic': np.array(systolic), 'blood_pressure_diastolic': np.array(diastolic),
+        'temperature': np.array(temperature, dtype=float), 'oxygen_saturation': np.array(oxygen),
+    }
+
+
+class EncodingTests(SimpleTestCase):
+    start_ms = to_epoch_ms(datetime(2030, 3, 1, tzinfo=dt_timezone.utc))
+
+    def assertRoundTrips(self, arrays):
+        first_ms, count, data = encode(arrays)
+        decoded = decode(data, count, first_ms)
+        order = np.argsort(arrays['timestamp'], kind='stable')
+        for name, values in arrays.items():
+            np.testing.assert_array_equal(decoded[name], np.asarray(values)[order], err_msg=name)
+
+    def test_random_day(self):
+        rng = np.random.default_rng(7)
+        size = 5000
+        self.assertRoundTrips(_arrays(
+            np.sort(self.start_ms + rng.integers(0, DAY_MS, size)), rng.integers(40, 201, size),
+            rng.integers(70, 201, size), rng.integers(40, 131, size),
+            np.round(rng.uniform(95, 105, size), 2), rng.integers(80, 101, size),
+        ))
+
+    def test_delta_edge_cases(self):
+        cases = {
+            'single sample': _arrays([self.start_ms], [72], [120], [80], [98.6], [98]),
+            # Largest swings between neighbours the validators allow, across the whole day
+            'extremes': _arrays([self.start_ms, self.start_ms + DAY_MS - 1, self.start_ms + 1],
+                                [40, 200, 40], [70, 200, 70], [40, 130, 40], [95.0, 105.0, 95.0], [80, 100, 80]),
+            'equal timestamps': _arrays([self.start_ms] * 3, [60, 61, 62], [110] * 3, [70] * 3,
+                                        [98.1, 98.2, 98.3], [97] * 3),
+            'unsorted input': _arrays([self.start_ms + 3000, self.start_ms, self.start_ms + 1000],
+                                      [90, 70, 80], [130, 110, 120], [85, 75, 80], [99.01, 97.99, 98.5],
+                                      [95, 99, 97]),
+        }
+        for name, arrays in cases.items():
+            with self.subTest(name):
+                self.assertRoundTrips(arrays)
+
+
+class VitalRecordSeriesTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = seed_user('blocks', 40)
+        self.blocks = user_records(self.user, VitalDayBlock)
+        self.assertTrue(self.blocks.exists())
+
+    def _series(self):
+        return VitalRecordSeries(user_records(self.user, VitalRecord), self.blocks, self.user)
+
+    def _add_raw(self, timestamp):
+        VitalRecord.objects.using(shard_for_user(self.user.pk)).create(
+            user=self.user, timestamp=timestamp, heart_rate=66, blood_pressure_systolic=115,
+            blood_pressure_diastolic=75, temperature=98.2, oxygen_saturation=97,
+        )
+
+    def test_raw_rows_in_compacted_days_are_merged_by_time(self):
+        block = self.blocks.order_by('-day').first()
+        # A reading replayed after its day was compacted, inside that day's samples
+        self._add_raw(block.first_timestamp + (block.last_timestamp - block.first_timestamp) / 2)
+        # And one for an older day that has no block
+        self._add_raw(self.blocks.order_by('day').first().first_timestamp - timedelta(days=3))
+
+        series = self._series()
+        total = user_records(self.user, VitalRecord).count() + sum(block.sample_count for block in self.blocks)
+        self.assertEqual(series.count(), total)
+        timestamps = [record.timestamp for record in series[:]]
+        self.assertEqual(len(timestamps), total)
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+        paged = []
+        for start in range(0, total, 7):
+            paged += [record.timestamp for record in self._series()[start:start + 7]]
+        self.assertEqual(paged, timestamps)
+
+    def test_latest_record_is_newest_even_if_raw_rows_are_older(self):
+        user_records(self.user, VitalRecord).delete()
+        newest = self.blocks.order_by('-day').first().last_timestamp
+        self._add_raw(newest - timedelta(hours=1))
+        record = latest_record(user_records(self.user, VitalRecord), self.blocks, self.user)
+        self.assertEqual(record.timestamp, newest)
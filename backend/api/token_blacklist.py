@@ -0,0 +1,132 @@
+"""
+Refresh-token blacklist.
+
+Revoked JTIs are stored in RevokedToken until the token would have
+expired anyway. Each process also keeps them in Bloom filters bucketed
+by expiry hour, so a lookup checks the one filter covering the token's
+``exp`` claim. Only a possible hit goes to the database. Expired buckets
+are dropped from memory, and expired rows are deleted at most once per
+PRUNE_SECONDS.
+
+The filters catch up with revocations made by other processes every
+TOKEN_BLACKLIST_SYNC_SECONDS. Correctness never depends on them:
+revoking inserts the JTI under its primary key, so a token that another
+worker has just rotated fails to be revoked a second time and is
+rejected (see RotatingTokenRefreshSerializer).
+"""
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .models import RevokedToken
+
+BUCKET_SECONDS = 3600
+BUCKET_CAPACITY = 20000
+FALSE_POSITIVE_RATE = 0.01
+PRUNE_SECONDS = 3600
+# Rows revoked slightly before the last sync by a worker with a skewed clock are still picked up.
+SYNC_OVERLAP_SECONDS = 30
+
+
+class BloomFilter:
+    def __init__(self, capacity=BUCKET_CAPACITY, error_rate=FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
+class RevocationFilter:
+    """
+    This process's view of the blacklist: {expiry hour: [BloomFilter, ...]}.
+    A bucket that outgrows its filter gets another one twice as large with
+    half the error rate, which keeps the overall false positive rate under
+    twice FALSE_POSITIVE_RATE.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+
+    def _add(self, jti, exp):
+        # Callers hold self._lock.
+        filters = self._buckets.setdefault(int(exp) // BUCKET_SECONDS, [BloomFilter()])
+        if filters[-1].count >= filters[-1].capacity:
+            filters.append(BloomFilter(filters[-1].capacity * 2, filters[-1].error_rate / 2))
+        filters[-1].add(jti)
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._add(jti, exp)
+
+    def might_contain(self, jti, exp):
+        self.sync()
+        with self._lock:
+            return any(jti in bloom for bloom in self._buckets.get(int(exp) // BUCKET_SECONDS, ()))
+
+    def sync(self, force=False):
+        now = time.time()
+        if not force and self._synced_at is not None and now - self._synced_at < settings.TOKEN_BLACKLIST_SYNC_SECONDS:
+            return
+        with self._lock:
+            if self._synced_at is None or force:
+                rows = RevokedToken.objects.filter(expires_at__gt=_timestamp(now))
+            else:
+                rows = RevokedToken.objects.filter(
+                    revoked_at__gte=_timestamp(self._synced_at - SYNC_OVERLAP_SECONDS)
+                )
+            for jti, expires_at in rows.values_list('jti', 'expires_at').iterator(chunk_size=5000):
+                self._add(jti, expires_at.timestamp())
+            for bucket in [bucket for bucket in self._buckets if (bucket + 1) * BUCKET_SECONDS <= now]:
+                del self._buckets[bucket]
+            self._synced_at = now
+        prune_expired()
+
+
+revocations = RevocationFilter()
+
+
+def prune_expired():
+    if cache.add('revoked-tokens:pruned', True, PRUNE_SECONDS):
+        RevokedToken.objects.filter(expires_at__lte=datetime.now(dt_timezone.utc)).delete()
+
+
+def is_revoked(jti, exp):
+    return revocations.might_contain(jti, exp) and RevokedToken.objects.filter(jti=jti).exists()
+
+
+def revoke(jti, exp):
+    """Blacklist a token until ``exp``. Returns False if it already was."""
+    try:
+        with transaction.atomic(using='default'):
+            RevokedToken.objects.create(jti=jti, expires_at=_timestamp(exp))
+    except IntegrityError:
+        return False
+    revocations.add(jti, exp)
+    return True
@@ -0,0 +1,245 @@
+"""
+Incremental maintenance of TwinState, the materialized state of a student's twin.
+
+Record inserts are folded into per-day [sum, count] buckets in O(1);
+updates and deletes of single records, which are rare, rebuild the state
+from the tables (a bounded number of aggregate queries). All changes run
+in a transaction on the user's shard.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import VitalRecord, VitalDayBlock, LifestyleRecord, AcademicMetric, Goal, TwinState
+
+WINDOW_DAYS = 30
+
+# model -> (TwinState field holding the latest reading, metrics bucketed per day)
+SOURCES = {
+    VitalRecord: ('latest_vitals', ['heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic',
+                                    'temperature', 'oxygen_saturation']),
+    LifestyleRecord: ('latest_lifestyle', ['sleep_hours', 'stress_level', 'diet_quality_score',
+                                           'water_intake', 'physical_activity_minutes']),
+    AcademicMetric: ('latest_academic', ['study_hours', 'attendance_percentage', 'focus_level',
+                                         'assignment_completion_rate']),
+}
+
+
+def _day(timestamp):
+    return timestamp.astimezone(dt_timezone.utc).date()
+
+
+def _latest(record, metrics):
+    latest = {metric: getattr(record, metric) for metric in metrics}
+    latest['timestamp'] = record.timestamp.isoformat()
+    return latest
+
+
+def _add_to_bucket(state, day, values, count=1):
+    bucket = state.daily.setdefault(day.isoformat(), {})
+    for metric, value in values.items():
+        total, n = bucket.get(metric, [0, 0])
+        bucket[metric] = [total + value, n + count]
+
+
+def _touch_day(state, day):
+    if state.last_active_day is None or day > state.last_active_day + timedelta(days=1):
+        state.current_streak = 1
+    elif day == state.last_active_day + timedelta(days=1):
+        state.current_streak += 1
+    else:
+        return
+    state.last_active_day = day
+    state.longest_streak = max(state.longest_streak, state.current_streak)
+
+
+def add_records(state, model, records):
+    latest_field, metrics = SOURCES[model]
+    oldest_kept = timezone.now().date() - timedelta(days=WINDOW_DAYS - 1)
+    latest = getattr(state, latest_field)
+    for record in records:
+        day = _day(record.timestamp)
+        if day >= oldest_kept:
+            _add_to_bucket(state, day, {metric: getattr(record, metric) for metric in metrics})
+        if not latest or record.timestamp.isoformat() >= latest['timestamp']:
+            latest = _latest(record, metrics)
+        _touch_day(state, day)
+    setattr(state, latest_field, latest)
+
+
+def _clamp(value, low=0.0, high=1.0):
+    return max(low, min(high, value))
+
+
+def _mean(values):
+    values = [value for value in values if value is not None]
+    return round(sum(values) / len(values), 1) if values else None
+
+
+def wellness_score(averages):
+    parts = []
+    if 'sleep_hours' in averages:
+        parts.append(100 * _clamp(1 - abs(averages['sleep_hours'] - 8) / 8))
+    if 'stress_level' in averages:
+        parts.append(100 * (10 - averages['stress_level']) / 9)
+    if 'diet_quality_score' in averages:
+        parts.append(100 * (averages['diet_quality_score'] - 1) / 9)
+    if 'physical_activity_minutes' in averages:
+        parts.append(100 * _clamp(averages['physical_activity_minutes'] / 30))
+    if 'heart_rate' in averages:
+        parts.append(100 * _clamp(1 - max(60 - averages['heart_rate'], averages['heart_rate'] - 100, 0) / 40))
+    if 'oxygen_saturation' in averages:
+        parts.append(100 * _clamp((averages['oxygen_saturation'] - 90) / 8))
+    return _mean(parts)
+
+
+def academic_score(averages):
+    parts = []
+    if 'attendance_percentage' in averages:
+        parts.append(averages['attendance_percentage'])
+    if 'assignment_completion_rate' in averages:
+        parts.append(averages['assignment_completion_rate'])
+    if 'focus_level' in averages:
+        parts.append(100 * (averages['focus_level'] - 1) / 9)
+    if 'study_hours' in averages:
+        parts.append(100 * _clamp(averages['study_hours'] / 4))
+    return _mean(parts)
+
+
+def _averages(daily, since):
+    totals = {}
+    for day, bucket in daily.items():
+        if day >= since.isoformat():
+            for metric, (total, count) in bucket.items():
+                running = totals.setdefault(metric, [0, 0])
+                running[0] += total
+                running[1] += count
+    return {metric: round(total / count, 2) for metric, (total, count) in totals.items() if count}
+
+
+def refresh_derived(state, today=None):
+    """Recompute averages, scores and streak for ``today`` from the stored buckets (no queries)."""
+    today = today or timezone.now().date()
+    oldest_kept = today - timedelta(days=WINDOW_DAYS - 1)
+    state.daily = {day: bucket for day, bucket in state.daily.items() if day >= oldest_kept.isoformat()}
+    state.averages_7d = _averages(state.daily, today - timedelta(days=6))
+    state.averages_30d = _averages(state.daily, oldest_kept)
+    if state.last_active_day is None or state.last_active_day < today - timedelta(days=1):
+        state.current_streak = 0
+    state.wellness_score = wellness_score(state.averages_7d)
+    state.academic_score = academic_score(state.averages_7d)
+    state.as_of = today
+    return state
+
+
+def goal_summary(user_id, alias):
+    goals = Goal.objects.using(alias).filter(user_id=user_id)
+    counts = goals.aggregate(
+        total=models.Count('id'),
+        completed=models.Count('id', filter=models.Q(is_completed=True)),
+    )
+    active = list(goals.filter(is_completed=False).values_list('current_value', 'target_value', 'deadline'))
+    progress = [min(current / target * 100, 100) if target else 0 for current, target, _ in active]
+    deadlines = [deadline for _, _, deadline in active]
+    return {
+        'total': counts['total'],
+        'active': len(active),
+        'completed': counts['completed'],
+        'average_progress': _mean(progress),
+        'next_deadline': min(deadlines).isoformat() if deadlines else None,
+    }
+
+
+def _active_days(user_id, alias):
+    days = set()
+    for model in SOURCES:
+        rows = model.objects.using(alias).filter(user_id=user_id)
+        days.update(rows.annotate(day=TruncDate('timestamp')).order_by().values_list('day', flat=True).distinct())
+    days.update(VitalDayBlock.objects.using(alias).filter(user_id=user_id).values_list('day', flat=True))
+    return sorted(days)
+
+
+def build_state(user_id, alias, state=None):
+    """Compute the twin state from the tables. Returns an unsaved TwinState."""
+    state = state or TwinState(user_id=user_id)
+    today = timezone.now().date()
+    oldest_kept = today - timedelta(days=WINDOW_DAYS - 1)
+    state.daily = {}
+    for model, (latest_field, metrics) in SOURCES.items():
+        rows = model.objects.using(alias).filter(user_id=user_id)
+        latest = rows.order_by('-timestamp').first()
+        setattr(state, latest_field, _latest(latest, metrics) if latest else {})
+        per_day = (rows.filter(timestamp__gte=datetime.combine(oldest_kept, time.min, tzinfo=dt_timezone.utc))
+                   .annotate(day=TruncDate('timestamp')).values('day')
+                   .annotate(samples=models.Count('id'), **{f'{metric}_sum': models.Sum(metric) for metric in metrics}))
+        for bucket in per_day:
+            _add_to_bucket(state, bucket['day'], {metric: bucket[f'{metric}_sum'] for metric in metrics},
+                           bucket['samples'])
+
+    blocks = VitalDayBlock.objects.using(alias).filter(user_id=user_id)
+    for block in blocks.filter(day__gte=oldest_kept):
+        arrays = block.arrays()
+        _add_to_bucket(state, block.day, {metric: float(arrays[metric].sum()) for metric in SOURCES[VitalRecord][1]},
+                       block.sample_count)
+    if not state.latest_vitals:
+        newest = blocks.order_by('-day').first()
+        if newest is not None:
+            arrays = newest.arrays()
+            state.latest_vitals = {metric: arrays[metric][-1].item() for metric in SOURCES[VitalRecord][1]}
+            state.latest_vitals['timestamp'] = newest.last_timestamp.isoformat()
+
+    state.current_streak = state.longest_streak = 0
+    state.last_active_day = None
+    for day in _active_days(user_id, alias):
+        _touch_day(state, day)
+    state.goals = goal_summary(user_id, alias)
+    return refresh_derived(state, today)
+
+
+def _update(user_id, alias, change):
+    with transaction.atomic(using=alias):
+        state = TwinState.objects.using(alias).select_for_update().filter(user_id=user_id).first()
+        if state is None:
+            try:
+                with transaction.atomic(using=alias):
+                    state = build_state(user_id, alias)
+                    state.version = 1
+                    state.save(using=alias, force_insert=True)
+                return state
+            except IntegrityError:
+                # Created concurrently; fall through and apply the change to it.
+                state = TwinState.objects.using(alias).select_for_update().get(user_id=user_id)
+        change(state)
+        state.version += 1
+        refresh_derived(state)
+        state.save(using=alias)
+        return state
+
+
+def apply_records(model, user_id, alias, records):
+    """Fold newly inserted records of one user into their twin state."""
+    if records:
+        _update(user_id, alias, lambda state: add_records(state, model, records))
+
+
+def refresh_goals(user_id, alias):
+    _update(user_id, alias, lambda state: setattr(state, 'goals', goal_summary(user_id, alias)))
+
+
+def rebuild(user_id, alias):
+    return _update(user_id, alias, lambda state: build_state(user_id, alias, state))
+
+
+def get_twin_state(user):
+    """Return the user's twin state, derived values current as of today."""
+    from .sharding import shard_for_user
+
+    alias = shard_for_user(user.pk)
+    state = TwinState.objects.using(alias).filter(user_id=user.pk).first()
+    if state is None:
+        return rebuild(user.pk, alias)
+    if state.as_of != timezone.now().date():
+        refresh_derived(state)
+    return state
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 from django.http import JsonResponse
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'vitals', views.VitalRecordViewSet, basename='vital')
@@ -24,9 +24,19 @@ urlpatterns = [
     path('auth/profile/', views.profile, name='profile'),
     path('auth/profile/update/', views.update_profile, name='profile-update'),
 
+    path('admin/users/bulk/', views.bulk_provision_users, name='bulk-provision'),
+
     path('auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     path('analytics/summary/', views.analytics_summary, name='analytics-summary'),
+    path('twin/', views.twin_state, name='twin-state'),
+    path('simulate/', views.simulate, name='simulate'),
+
+    # Async reads for ASGI deployments
+    path('async/analytics/summary/', async_views.analytics_summary, name='async-analytics-summary'),
+    path('async/vitals/latest/', async_views.vital_latest, name='async-vital-latest'),
+    path('async/goals/', async_views.goal_list, name='async-goal-list'),
+    path('async/achievements/', async_views.achievement_list, name='async-achievement-list'),
 
     # ✅ NEW – test endpoint
     path('ping/', ping, name='ping'),
@@ -1,14 +1,15 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import get_user_model
+from django.conf import settings
 from django.utils import timezone
-from django.db import models
-from datetime import timedelta
-from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiTypes
+from django.db import transaction
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
 
+from .analytics import parse_days, summary
+from .filters import RecordQueryMixin
 from .models import VitalRecord, LifestyleRecord, AcademicMetric, Goal, AchievementBadge, ExportRequest
 from .serializers import (
     UserRegistrationSerializer, UserProfileSerializer, UserUpdateSerializer,
@@ -17,10 +18,11 @@ from .serializers import (
     AcademicMetricSerializer, AcademicMetricCreateSerializer,
     GoalSerializer, GoalCreateSerializer, GoalUpdateSerializer,
     AchievementBadgeSerializer,
-    ExportRequestSerializer, ExportRequestCreateSerializer
+    ExportRequestSerializer, ExportRequestCreateSerializer,
+    TwinStateSerializer, SimulationRequestSerializer, BulkProvisionSerializer
 )
-
-User = get_user_model()
+from .sharding import shard_for_user
+from .twin import get_twin_state
 
 # ---------------------- AUTHENTICATION ---------------------- #
 
@@ -69,14 +71,7 @@ def login(request):
         return Response({'error': 'Please provide username/email and password'},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    user = authenticate(username=username_or_email, password=password)
-
-    if not user:
-        try:
-            user_obj = User.objects.get(email=username_or_email)
-            user = authenticate(username=user_obj.username, password=password)
-        except User.DoesNotExist:
-            pass
+    user = authenticate(request, username=username_or_email, password=password)
 
     if user:
         refresh = RefreshToken.for_user(user)
@@ -116,34 +111,129 @@ def update_profile(request):
         return Response(UserProfileSerializer(request.user).data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+@extend_schema(
+    request={'multipart/form-data': BulkProvisionSerializer},
+    responses={201: dict, 400: dict},
+    description="Admin only. Create student accounts from a CSV upload, with a per-row report "
+                "(created, or the validation/duplicate errors). Use the provision_users command for files "
+                "larger than the request limit."
+)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_provision_users(request):
+    from .provisioning import MAX_API_ROWS, provision, read_rows
+
+    serializer = BulkProvisionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    rows, error = read_rows(serializer.validated_data['file'])
+    if not error and len(rows) > MAX_API_ROWS:
+        error = f'{len(rows)} rows uploaded; the limit is {MAX_API_ROWS}. Use the provision_users command.'
+    if error:
+        return Response({'file': [error]}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Hash in this thread: forking a process pool from a threaded web worker is unsafe.
+    results = provision(rows, workers=1, issue_tokens=serializer.validated_data['issue_tokens'],
+                        dry_run=serializer.validated_data['dry_run'])
+    dry_run = serializer.validated_data['dry_run']
+    succeeded = sum(result['status'] != 'failed' for result in results)
+    if not succeeded:
+        response_status = status.HTTP_400_BAD_REQUEST
+    else:
+        response_status = status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED
+    return Response({
+        'created': 0 if dry_run else succeeded,
+        'failed': len(results) - succeeded,
+        'rows': results,
+    }, status=response_status)
+
+# ---------------------- USER WRITES ---------------------- #
+
+class UserAtomicWritesMixin:
+    """Runs writes in one transaction on the user's shard, so the twin state update commits with the row."""
+
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic(using=shard_for_user(request.user.pk)):
+            return super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic(using=shard_for_user(request.user.pk)):
+            return super().update(request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic(using=shard_for_user(request.user.pk)):
+            return super().destroy(request, *args, **kwargs)
+
+# ---------------------- RECORD QUERY PARAMETERS ---------------------- #
+
+RECORD_QUERY_PARAMETERS = [
+    OpenApiParameter("start_date", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description="ISO 8601 date or datetime, inclusive"),
+    OpenApiParameter("end_date", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description="ISO 8601 date or datetime, inclusive (a date covers the whole day)"),
+    OpenApiParameter("last", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description="Relative range instead of start_date, e.g. 30m, 12h, 7d, 2w"),
+    OpenApiParameter("fields", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                     description="Comma separated fields to return, e.g. heart_rate,timestamp"),
+]
+record_query_schema = extend_schema_view(
+    list=extend_schema(parameters=RECORD_QUERY_PARAMETERS),
+    retrieve=extend_schema(parameters=RECORD_QUERY_PARAMETERS[3:]),
+)
+
 # ---------------------- VITAL RECORD ---------------------- #
 
-class VitalRecordViewSet(viewsets.ModelViewSet):
+@record_query_schema
+class VitalRecordViewSet(UserAtomicWritesMixin, RecordQueryMixin, viewsets.ModelViewSet):
     serializer_class = VitalRecordSerializer
     permission_classes = [IsAuthenticated]
     queryset = VitalRecord.objects.all()
 
-    def get_queryset(self):
-        queryset = VitalRecord.objects.filter(user=self.request.user)
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(timestamp__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(timestamp__lte=end_date)
-        return queryset
-
     def get_serializer_class(self):
         if self.action == 'create':
             return VitalRecordCreateSerializer
         return VitalRecordSerializer
 
+    def create(self, request, *args, **kwargs):
+        if not settings.VITAL_INGEST_BUFFERED:
+            return super().create(request, *args, **kwargs)
+        from .ingest import get_vital_buffer
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entry = get_vital_buffer().append(request.user.id, serializer.validated_data)
+        return Response(entry, status=status.HTTP_202_ACCEPTED)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def get_series(self):
+        """Raw rows plus samples compacted into VitalDayBlocks, newest first."""
+        from .vital_blocks import VitalRecordSeries
+
+        start, end = self.get_time_range()
+        blocks = self.request.user.vital_blocks.all()
+        if start:
+            blocks = blocks.filter(last_timestamp__gte=start)
+        if end:
+            blocks = blocks.filter(first_timestamp__lte=end)
+        return VitalRecordSeries(self.filter_queryset(self.get_queryset()), blocks, self.request.user, start, end)
+
+    def list(self, request, *args, **kwargs):
+        series = self.get_series()
+        page = self.paginate_queryset(series)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(series[:], many=True)
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def latest(self, request):
-        latest_record = self.get_queryset().first()
+        from .vital_blocks import latest_record as find_latest
+
+        latest_record = find_latest(self.get_queryset(), self.request.user.vital_blocks.all(), self.request.user)
         if latest_record:
             serializer = self.get_serializer(latest_record)
             return Response(serializer.data)
@@ -151,21 +241,12 @@ class VitalRecordViewSet(viewsets.ModelViewSet):
 
 # ---------------------- LIFESTYLE RECORD ---------------------- #
 
-class LifestyleRecordViewSet(viewsets.ModelViewSet):
+@record_query_schema
+class LifestyleRecordViewSet(UserAtomicWritesMixin, RecordQueryMixin, viewsets.ModelViewSet):
     serializer_class = LifestyleRecordSerializer
     permission_classes = [IsAuthenticated]
     queryset = LifestyleRecord.objects.all()
 
-    def get_queryset(self):
-        queryset = LifestyleRecord.objects.filter(user=self.request.user)
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(timestamp__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(timestamp__lte=end_date)
-        return queryset
-
     def get_serializer_class(self):
         if self.action == 'create':
             return LifestyleRecordCreateSerializer
@@ -176,21 +257,12 @@ class LifestyleRecordViewSet(viewsets.ModelViewSet):
 
 # ---------------------- ACADEMIC METRIC ---------------------- #
 
-class AcademicMetricViewSet(viewsets.ModelViewSet):
+@record_query_schema
+class AcademicMetricViewSet(UserAtomicWritesMixin, RecordQueryMixin, viewsets.ModelViewSet):
     serializer_class = AcademicMetricSerializer
     permission_classes = [IsAuthenticated]
     queryset = AcademicMetric.objects.all()
 
-    def get_queryset(self):
-        queryset = AcademicMetric.objects.filter(user=self.request.user)
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(timestamp__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(timestamp__lte=end_date)
-        return queryset
-
     def get_serializer_class(self):
         if self.action == 'create':
             return AcademicMetricCreateSerializer
@@ -201,13 +273,13 @@ class AcademicMetricViewSet(viewsets.ModelViewSet):
 
 # ---------------------- GOALS ---------------------- #
 
-class GoalViewSet(viewsets.ModelViewSet):
+class GoalViewSet(UserAtomicWritesMixin, viewsets.ModelViewSet):
     serializer_class = GoalSerializer
     permission_classes = [IsAuthenticated]
     queryset = Goal.objects.all()
 
     def get_queryset(self):
-        queryset = Goal.objects.filter(user=self.request.user)
+        queryset = self.request.user.goals.all()
         is_completed = self.request.query_params.get('completed')
         if is_completed is not None:
             is_completed = is_completed.lower() == 'true'
@@ -238,7 +310,7 @@ class AchievementBadgeViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = AchievementBadge.objects.all()
 
     def get_queryset(self):
-        return AchievementBadge.objects.filter(user=self.request.user)
+        return self.request.user.achievements.all()
 
 # ---------------------- EXPORT REQUEST ---------------------- #
 
@@ -249,7 +321,7 @@ class ExportRequestViewSet(viewsets.ModelViewSet):
     queryset = ExportRequest.objects.all()
 
     def get_queryset(self):
-        return ExportRequest.objects.filter(user=self.request.user)
+        return self.request.user.export_requests.all()
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -258,7 +330,9 @@ class ExportRequestViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         export_request = serializer.save(user=self.request.user)
-        self.process_export(export_request)
+        # PDF reports stay pending until the render_reports command renders them out of process.
+        if export_request.format != 'pdf':
+            self.process_export(export_request)
 
     def process_export(self, export_request):
         try:
@@ -270,47 +344,49 @@ class ExportRequestViewSet(viewsets.ModelViewSet):
             export_request.status = 'failed'
             export_request.save()
 
+# ---------------------- TWIN STATE ---------------------- #
+
+@extend_schema(
+    responses={200: TwinStateSerializer},
+    description="Current state of the user's digital twin: latest readings, rolling 7/30-day averages, "
+                "streaks, wellness/academic scores and active goals. Maintained on every write."
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def twin_state(request):
+    return Response(TwinStateSerializer(get_twin_state(request.user)).data)
+
+# ---------------------- SIMULATION ---------------------- #
+
+@extend_schema(
+    request=SimulationRequestSerializer,
+    responses={200: dict, 400: dict},
+    description="What-if simulation: predicts focus, assignment completion, stress and heart rate for every "
+                "combination of lever changes (sleep, activity, water, diet, study) from models fitted "
+                "on the user's own daily history."
+)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def simulate(request):
+    from .simulation import simulate as run_simulation
+
+    serializer = SimulationRequestSerializer(data=request.data)
+    if serializer.is_valid():
+        state = get_twin_state(request.user)
+        result = run_simulation(state, shard_for_user(request.user.pk), **serializer.validated_data)
+        return Response(result)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 # ---------------------- ANALYTICS SUMMARY ---------------------- #
 
 @extend_schema(
     parameters=[
         OpenApiParameter("days", OpenApiTypes.INT, OpenApiParameter.QUERY, description="Number of days (default: 30)")
     ],
-    responses={200: dict},
+    responses={200: dict, 400: dict},
     description="Returns average stats of vitals, lifestyle, academic and goals over a time period."
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def analytics_summary(request):
-    user = request.user
-    days = int(request.query_params.get('days', 30))
-    start_date = timezone.now() - timedelta(days=days)
-
-    vitals = VitalRecord.objects.filter(user=user, timestamp__gte=start_date)
-    lifestyle = LifestyleRecord.objects.filter(user=user, timestamp__gte=start_date)
-    academic = AcademicMetric.objects.filter(user=user, timestamp__gte=start_date)
-    goals = Goal.objects.filter(user=user)
-
-    return Response({
-        'period_days': days,
-        'vitals': {
-            'count': vitals.count(),
-            'avg_heart_rate': vitals.aggregate(models.Avg('heart_rate'))['heart_rate__avg'],
-            'avg_spo2': vitals.aggregate(models.Avg('oxygen_saturation'))['oxygen_saturation__avg'],
-        },
-        'lifestyle': {
-            'count': lifestyle.count(),
-            'avg_sleep': lifestyle.aggregate(models.Avg('sleep_hours'))['sleep_hours__avg'],
-            'avg_stress': lifestyle.aggregate(models.Avg('stress_level'))['stress_level__avg'],
-        },
-        'academic': {
-            'count': academic.count(),
-            'avg_study_hours': academic.aggregate(models.Avg('study_hours'))['study_hours__avg'],
-            'avg_attendance': academic.aggregate(models.Avg('attendance_percentage'))['attendance_percentage__avg'],
-        },
-        'goals': {
-            'total': goals.count(),
-            'active': goals.filter(is_completed=False).count(),
-            'completed': goals.filter(is_completed=True).count(),
-        }
-    }, status=status.HTTP_200_OK)
+    return Response(summary(request.user, parse_days(request.query_params)), status=status.HTTP_200_OK)
@@ -0,0 +1,290 @@
+"""
+Compact storage for dense vitals streams.
+
+A VitalDayBlock packs one user's readings for one day into a single zlib
+compressed blob of delta-encoded little-endian columns:
+
+    timestamp (ms offset from first_timestamp, int32), heart_rate,
+    blood_pressure_systolic, blood_pressure_diastolic,
+    temperature (hundredths of a degree), oxygen_saturation (all int16)
+
+Decoding decompresses once and reads every column through np.frombuffer
+views over that buffer, so only the delta prefix sums allocate.
+"""
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+
+COLUMNS = [
+    ('timestamp', '<i4'),
+    ('heart_rate', '<i2'),
+    ('blood_pressure_systolic', '<i2'),
+    ('blood_pressure_diastolic', '<i2'),
+    ('temperature', '<i2'),
+    ('oxygen_saturation', '<i2'),
+]
+VITAL_COLUMNS = [name for name, _ in COLUMNS[1:]]
+TEMPERATURE_SCALE = 100
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def to_epoch_ms(value):
+    return int((value - EPOCH) / timedelta(milliseconds=1))
+
+
+def from_epoch_ms(value):
+    return EPOCH + timedelta(milliseconds=int(value))
+
+
+def encode(arrays):
+    """Encode a dict of equally sized arrays (``timestamp`` in epoch ms) sorted by time."""
+    order = np.argsort(arrays['timestamp'], kind='stable')
+    timestamps = np.asarray(arrays['timestamp'], dtype=np.int64)[order]
+    first_ms = int(timestamps[0])
+    columns = {'timestamp': timestamps - first_ms}
+    for name in VITAL_COLUMNS:
+        values = np.asarray(arrays[name])[order]
+        if name == 'temperature':
+            values = np.rint(values * TEMPERATURE_SCALE)
+        columns[name] = values.astype(np.int64)
+
+    chunks = []
+    for name, dtype in COLUMNS:
+        deltas = np.diff(columns[name], prepend=0)
+        chunks.append(deltas.astype(dtype).tobytes())
+    return first_ms, len(timestamps), zlib.compress(b''.join(chunks), 6)
+
+
+def decode(data, count, first_ms):
+    """Return a dict of decoded arrays; ``timestamp`` is int64 epoch ms."""
+    raw = zlib.decompress(bytes(data))
+    arrays = {}
+    offset = 0
+    for name, dtype in COLUMNS:
+        deltas = np.frombuffer(raw, dtype=dtype, count=count, offset=offset)
+        offset += deltas.nbytes
+        arrays[name] = np.cumsum(deltas, dtype=np.int64)
+    arrays['timestamp'] += first_ms
+    arrays['temperature'] = arrays['temperature'] / TEMPERATURE_SCALE
+    return arrays
+
+
+def merge(*parts):
+    parts = [part for part in parts if part is not None and len(part['timestamp'])]
+    return {name: np.concatenate([part[name] for part in parts]) for name, _ in COLUMNS}
+
+
+def range_mask(arrays, start=None, end=None):
+    mask = np.ones(len(arrays['timestamp']), dtype=bool)
+    if start is not None:
+        mask &= arrays['timestamp'] >= to_epoch_ms(start)
+    if end is not None:
+        mask &= arrays['timestamp'] <= to_epoch_ms(end)
+    return mask
+
+
+class VitalRecordSeries:
+    """
+    Sequence of VitalRecord rows newest first, merging raw rows from
+    ``queryset`` with samples unpacked from ``blocks`` (compacted days).
+    Raw rows are normally newer than every block; the few that are not
+    (readings replayed or copied in after their day was compacted) are
+    merged into their day by timestamp. Supports count() and slicing, so
+    DRF pagination can page through it while only decoding the blocks
+    that fall in the requested page.
+    """
+
+    def __init__(self, queryset, blocks, user, start=None, end=None):
+        self.queryset = queryset
+        self.blocks = list(blocks.defer('data').order_by('-day'))
+        self.user = user
+        self.start = start
+        self.end = end
+        # Raw rows after this instant are newer than every block sample.
+        self.boundary = self.blocks[0].last_timestamp if self.blocks else None
+        self._raw_counts = None
+        self._segments = None
+        self._block_counts = {}
+        self._decoded = {}
+
+    def _is_partial(self, block):
+        return ((self.start is not None and block.first_timestamp < self.start)
+                or (self.end is not None and block.last_timestamp > self.end))
+
+    def _arrays(self, block):
+        if block.pk not in self._decoded:
+            arrays = block.arrays()
+            if self._is_partial(block):
+                mask = range_mask(arrays, self.start, self.end)
+                arrays = {name: values[mask] for name, values in arrays.items()}
+            self._decoded[block.pk] = arrays
+        return self._decoded[block.pk]
+
+    def _load_data(self, blocks):
+        """Fetch the deferred blobs of ``blocks`` in one query instead of one per block."""
+        missing = [block for block in blocks
+                   if block.pk not in self._decoded and 'data' in block.get_deferred_fields()]
+        if missing:
+            model = type(missing[0])
+            data = dict(model._base_manager.using(missing[0]._state.db)
+                        .filter(pk__in=[block.pk for block in missing]).values_list('pk', 'data'))
+            for block in missing:
+                block.data = data[block.pk]
+
+    def _block_count(self, block):
+        if block.pk not in self._block_counts:
+            if self._is_partial(block):
+                self._block_counts[block.pk] = len(self._arrays(block)['timestamp'])
+            else:
+                self._block_counts[block.pk] = block.sample_count
+        return self._block_counts[block.pk]
+
+    def raw_counts(self):
+        """(raw rows newer than every block, raw rows within the compacted days) in one query."""
+        if self._raw_counts is None:
+            if self.boundary is None:
+                self._raw_counts = (self.queryset.count(), 0)
+            else:
+                from django.db.models import Count, Q
+
+                counts = self.queryset.aggregate(head=Count('pk', filter=Q(timestamp__gt=self.boundary)),
+                                                 tail=Count('pk', filter=Q(timestamp__lte=self.boundary)))
+                self._raw_counts = (counts['head'], counts['tail'])
+        return self._raw_counts
+
+    def segments(self):
+        """[(block or None, raw rows of the same day newest first)], newest day first."""
+        if self._segments is None:
+            late = {}
+            if self.raw_counts()[1]:
+                for record in self.queryset.filter(timestamp__lte=self.boundary).order_by('-timestamp'):
+                    late.setdefault(record.timestamp.astimezone(dt_timezone.utc).date(), []).append(record)
+            blocks = {block.day: block for block in self.blocks}
+            self._segments = [(blocks.get(day), late.get(day, []))
+                              for day in sorted(set(blocks) | set(late), reverse=True)]
+        return self._segments
+
+    def _segment_count(self, segment):
+        block, records = segment
+        return (self._block_count(block) if block is not None else 0) + len(records)
+
+    def count(self):
+        self._load_data([block for block in self.blocks if self._is_partial(block)])
+        return self.raw_counts()[0] + sum(self._segment_count(segment) for segment in self.segments())
+
+    def __len__(self):
+        return self.count()
+
+    def _block_record(self, arrays, index):
+        from .models import VitalRecord
+
+        return VitalRecord(
+            user=self.user,
+            timestamp=from_epoch_ms(arrays['timestamp'][index]),
+            temperature=float(arrays['temperature'][index]),
+            **{name: int(arrays[name][index]) for name in VITAL_COLUMNS if name != 'temperature'}
+        )
+
+    def _segment_records(self, segment, start, stop):
+        block, records = segment
+        if block is None:
+            return records[start:stop]
+        arrays = self._arrays(block)
+        size = len(arrays['timestamp'])
+        # Position of each raw row among the block samples, newest first; ties put the raw row first.
+        positions = {}
+        for index, record in enumerate(records):
+            newer = size - int(np.searchsorted(arrays['timestamp'], to_epoch_ms(record.timestamp), side='right'))
+            positions[index + newer] = record
+        sample = start - sum(1 for position in positions if position < start)
+        results = []
+        for position in range(start, stop):
+            if position in positions:
+                results.append(positions[position])
+            else:
+                # Blocks are stored oldest first; the series is newest first.
+                results.append(self._block_record(arrays, size - 1 - sample))
+                sample += 1
+        return results
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(self.count())
+        results = []
+        head, _ = self.raw_counts()
+        if start < head:
+            queryset = self.queryset if self.boundary is None else self.queryset.filter(timestamp__gt=self.boundary)
+            results.extend(queryset[start:min(stop, head)])
+        offset = head
+        pages = []
+        for segment in self.segments():
+            if offset >= stop:
+                break
+            size = self._segment_count(segment)
+            if offset + size > start:
+                pages.append((segment, max(start - offset, 0), min(stop - offset, size)))
+            offset += size
+        self._load_data([segment[0] for segment, _, _ in pages if segment[0] is not None])
+        for segment, first, last in pages:
+            results.extend(self._segment_records(segment, first, last))
+        return results
+
+
+def latest_record(queryset, blocks, user):
+    """The newest vital reading, raw or compacted."""
+    from django.db.models import Exists, OuterRef
+
+    # One query: the newest raw row, and whether a block holds anything newer.
+    record = queryset.annotate(
+        older_than_blocks=Exists(blocks.filter(last_timestamp__gt=OuterRef('timestamp')))
+    ).first()
+    if record is not None and not record.older_than_blocks:
+        return record
+    records = VitalRecordSeries(queryset, blocks, user)[:1]
+    return records[0] if records else None
+
+
+def summarize_blocks(blocks, start=None, end=None):
+    """Return (count, {column: sum}) over the block samples inside the range."""
+    count = 0
+    sums = {name: 0.0 for name in VITAL_COLUMNS}
+    for block in blocks:
+        arrays = block.arrays()
+        mask = range_mask(arrays, start, end)
+        count += int(mask.sum())
+        for name in VITAL_COLUMNS:
+            sums[name] += float(arrays[name][mask].sum())
+    return count, sums
+
+
+def compact_day(user_id, day):
+    """Move one user's raw VitalRecord rows for ``day`` into that day's block. Returns rows moved."""
+    from django.db import transaction
+    from .models import VitalRecord, VitalDayBlock
+    from .sharding import shard_for_user
+
+    alias = shard_for_user(user_id)
+    day_start = datetime(day.year, day.month, day.day, tzinfo=dt_timezone.utc)
+    rows = VitalRecord.objects.using(alias).filter(
+        user_id=user_id, timestamp__gte=day_start, timestamp__lt=day_start + timedelta(days=1)
+    )
+    with transaction.atomic(using=alias):
+        values = list(rows.order_by('timestamp').values_list('id', 'timestamp', *VITAL_COLUMNS))
+        if not values:
+            return 0
+        ids, timestamps, *columns = zip(*values)
+        arrays = {'timestamp': np.array([to_epoch_ms(ts) for ts in timestamps], dtype=np.int64)}
+        arrays.update({name: np.array(column) for name, column in zip(VITAL_COLUMNS, columns)})
+
+        block = VitalDayBlock.objects.using(alias).select_for_update().filter(user_id=user_id, day=day).first()
+        if block is None:
+            block = VitalDayBlock(user_id=user_id, day=day)
+        else:
+            arrays = merge(block.arrays(), arrays)
+        block.set_arrays(arrays)
+        block.save(using=alias)
+        for index in range(0, len(ids), 500):
+            VitalRecord.objects.using(alias).filter(pk__in=ids[index:index + 500]).delete()
+    return len(ids)
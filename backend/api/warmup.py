@@ -0,0 +1,53 @@
+"""
+Work a fresh worker does before it accepts traffic (gunicorn.conf.py),
+so that the first requests it serves are not the slow ones.
+
+load() imports what requests need: the URLconf with every view and
+serializer, and the lazily imported modules on hot paths. It touches no
+database, so it may run in gunicorn's master before workers fork.
+connect() opens this process's database and cache connections and
+loads the refresh-token blacklist; it must run in each worker.
+"""
+import time
+
+from django.conf import settings
+
+# Lazily imported by views that most sessions hit
+HOT_MODULES = ['api.vital_blocks', 'api.analytics']
+
+
+def load():
+    import importlib
+
+    from django.urls import get_resolver
+
+    from .schema import static_schema
+
+    get_resolver().url_patterns
+    for module in HOT_MODULES:
+        importlib.import_module(module)
+    static_schema()
+
+
+def connect():
+    from django.core.cache import cache
+    from django.db import connections
+
+    from .token_blacklist import revocations
+
+    for alias in settings.DATABASES:
+        connections[alias].ensure_connection()
+    cache.get('warm-up')
+    revocations.sync(force=True)
+
+
+def warm_up(include_connect=True):
+    """Run the warm-up steps; returns seconds per step and in total."""
+    timings = {}
+    started = time.perf_counter()
+    for step in (load, connect) if include_connect else (load,):
+        step_started = time.perf_counter()
+        step()
+        timings[step.__name__] = time.perf_counter() - step_started
+    timings['total'] = time.perf_counter() - started
+    return timings
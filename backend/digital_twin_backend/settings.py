@@ -34,6 +34,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
+    'api.middleware.UserShardMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -63,10 +65,51 @@ DATABASES = {
     'default': dj_database_url.config()
 }
 
+# Read replicas - comma separated database URLs (e.g. postgres://.../replica1,postgres://.../replica2)
+DATABASE_REPLICAS = []
+for index, url in enumerate(u for u in config('REPLICA_DATABASE_URLS', default='').split(',') if u):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = dj_database_url.parse(url)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS.append(alias)
+
+# Shards for per-user data - 'default' plus comma separated database URLs.
+# Create their tables with: python manage.py migrate --database=shard_1
+SHARD_DATABASES = ['default']
+for index, url in enumerate(u for u in config('SHARD_DATABASE_URLS', default='').split(',') if u):
+    alias = f'shard_{index + 1}'
+    DATABASES[alias] = dj_database_url.parse(url)
+    SHARD_DATABASES.append(alias)
+
+# Cache shared by every worker. The default is per process; moving users between shards
+# (rebalance_shards) needs a shared backend so all workers see new placements at once,
+# e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache, CACHE_LOCATION=redis://127.0.0.1:6379
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+DATABASE_ROUTERS = ['api.db_routers.ShardRouter', 'api.db_routers.PrimaryReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write something
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=15, cast=int)
 
 
+# Buffered vitals ingestion - readings are logged to disk, acknowledged with 202
+# and bulk inserted by a background flusher (see api/ingest.py)
+VITAL_INGEST_BUFFERED = config('VITAL_INGEST_BUFFERED', default=False, cast=bool)
+VITAL_INGEST_LOG_DIR = config('VITAL_INGEST_LOG_DIR', default=os.path.join(BASE_DIR, 'var', 'vital_ingest'))
+VITAL_INGEST_BATCH_SIZE = config('VITAL_INGEST_BATCH_SIZE', default=500, cast=int)
+VITAL_INGEST_FLUSH_SECONDS = config('VITAL_INGEST_FLUSH_SECONDS', default=2.0, cast=float)
+VITAL_INGEST_FSYNC = config('VITAL_INGEST_FSYNC', default=True, cast=bool)
+
 AUTH_USER_MODEL = 'api.User'
 
+# Login by username or email, case-insensitively
+AUTHENTICATION_BACKENDS = ['api.backends.UsernameOrEmailBackend']
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -86,6 +129,14 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Institution-wide Parquet/Arrow exports (export_dataset command); kept out of MEDIA_ROOT
+DATASET_EXPORT_ROOT = config('DATASET_EXPORT_ROOT', default=os.path.join(BASE_DIR, 'var', 'datasets'))
+
+# Rendered chart images reused by PDF export reports (render_reports command, see api/pdf_reports.py)
+REPORT_CHART_CACHE_DIR = config('REPORT_CHART_CACHE_DIR', default=os.path.join(BASE_DIR, 'var', 'report_charts'))
+# Reports claimed longer ago than this are assumed lost with their render_reports run and queued again
+REPORT_CLAIM_TIMEOUT_SECONDS = config('REPORT_CLAIM_TIMEOUT_SECONDS', default=3600, cast=int)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework
@@ -111,8 +162,15 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': config('JWT_SECRET_KEY', default=SECRET_KEY),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.RotatingTokenRefreshSerializer',
 }
 
+# Seconds between each process's catch-up on refresh tokens revoked by other processes (see api/token_blacklist.py)
+TOKEN_BLACKLIST_SYNC_SECONDS = config('TOKEN_BLACKLIST_SYNC_SECONDS', default=5, cast=int)
+
+# Async read endpoints (/api/async/, see api/async_views.py) - run each read on its own thread and connection
+ASYNC_READS_IN_PARALLEL = config('ASYNC_READS_IN_PARALLEL', default=True, cast=bool)
+
 # CORS
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS',
@@ -126,3 +184,6 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Student Health & Academic Performance Tracking System',
     'VERSION': '1.0.0',
 }
+
+# Schema file written by `python manage.py build_schema` and served by /api/schema/ (see api/schema.py)
+OPENAPI_SCHEMA_FILE = config('OPENAPI_SCHEMA_FILE', default=os.path.join(BASE_DIR, 'var', 'openapi-schema.yml'))
@@ -0,0 +1,33 @@
+"""
+Gunicorn settings. From backend/: gunicorn -c gunicorn.conf.py
+
+The master imports Django and the whole app once (preload_app) and
+workers fork with it already loaded. Each worker then opens its own
+connections (api/warmup.py) before it accepts a request, so new workers
+start serving at full speed. Build the schema file at deploy time with
+`python manage.py build_schema`.
+"""
+import os
+
+wsgi_app = 'digital_twin_backend.wsgi:application'
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from api.warmup import warm_up
+
+    timings = warm_up(include_connect=False)
+    server.log.info('Loaded the application in %.0f ms', timings['total'] * 1000)
+
+
+def post_worker_init(worker):
+    from api.warmup import warm_up
+
+    timings = warm_up()
+    worker.log.info('Worker warmed up in %.0f ms (%s)', timings['total'] * 1000,
+                    ', '.join(f'{step} {seconds * 1000:.0f} ms' for step, seconds in timings.items() if step != 'total'))